@@ -16,7 +16,8 @@ from .config import (
     Buttons
 )
 
-from .database import Database
+from .database import Database, get_database
+from .storage import Storage
 from . import utils
 from . import handlers
 
@@ -38,6 +39,8 @@ __all__ = [
     'Messages',
     'Buttons',
     'Database',
+    'get_database',
+    'Storage',
     'utils',
     'handlers'
 ]
@@ -12,12 +12,41 @@ API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
 
 # Database Configuration
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()  # mongo, sqlite or memory
+SQLITE_PATH = os.getenv("SQLITE_PATH", "alphashare.db")
 MONGO_URI = os.getenv("MONGO_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")  # e.g. "zstd,snappy,zlib" when the extras are installed
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))  # Seconds between /stats drift corrections
+WRITE_BUFFER_MAX_OPS = int(os.getenv("WRITE_BUFFER_MAX_OPS", "500"))  # Flush buffered counter writes at this many ops
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", "5"))  # ...or after this many seconds
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))  # File/batch documents kept in memory
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))  # Seconds before a cached file/batch is re-read
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "60"))  # Seconds an unknown file/batch id is remembered
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))  # Minimum ids sized into the known-id filter
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.001"))
+USER_ACTIVITY_GRANULARITY = int(os.getenv("USER_ACTIVITY_GRANULARITY", "600"))  # At most one last_active write per user per window (seconds)
+SEEN_USERS_MAX_SIZE = int(os.getenv("SEEN_USERS_MAX_SIZE", "100000"))
+SEEN_USERS_TTL = int(os.getenv("SEEN_USERS_TTL", "86400"))
+DELIVERY_RETENTION_DAYS = int(os.getenv("DELIVERY_RETENTION_DAYS", "7"))  # How long delivery records of non-expiring files are kept
+DELETE_QUEUE_WINDOW = int(os.getenv("DELETE_QUEUE_WINDOW", "600"))  # Seconds of upcoming auto-deletes kept in memory
+DELETE_COALESCE_WINDOW = int(os.getenv("DELETE_COALESCE_WINDOW", "10"))  # Deletions due this close together share one call per chat
+DELETE_QUEUE_BATCH = int(os.getenv("DELETE_QUEUE_BATCH", "500"))  # Max scheduled deletions loaded per read
+BATCH_DRAFT_TTL = int(os.getenv("BATCH_DRAFT_TTL", "21600"))  # Seconds an idle /batch session is kept before it expires
+BATCH_JOB_TTL = int(os.getenv("BATCH_JOB_TTL", "86400"))  # Seconds an unfinished batch delivery can still be resumed
+CHECK_INDEXES = os.getenv("CHECK_INDEXES", "False").lower() == "true"  # Fail startup if a query falls back to COLLSCAN
 
 # Channel Configuration
 DB_CHANNEL_ID = int(os.getenv("DB_CHANNEL_ID"))
 FORCE_SUB_CHANNEL = int(os.getenv("FORCE_SUB_CHANNEL"))
+FORCE_SUB_CACHE_SIZE = int(os.getenv("FORCE_SUB_CACHE_SIZE", "100000"))
+FORCE_SUB_CACHE_TTL = int(os.getenv("FORCE_SUB_CACHE_TTL", "600"))  # Seconds a channel member is not re-checked
+FORCE_SUB_NEGATIVE_TTL = int(os.getenv("FORCE_SUB_NEGATIVE_TTL", "30"))  # Seconds a non-member is not re-checked
 
 # Bot Information
 BOT_USERNAME = os.getenv("BOT_USERNAME")
@@ -41,6 +70,28 @@ DEFAULT_PARSE_MODE = "Markdown"  # or "HTML" if you prefer HTML formatting
 MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))  # Maximum files in a batch
 BATCH_AUTO_DELETE = bool(os.getenv("BATCH_AUTO_DELETE", "True"))  # Auto-delete batch messages
 DEFAULT_DELETE_TIME = int(os.getenv("DEFAULT_DELETE_TIME", "1"))  # Default 1 hour
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "100"))  # Files sent per multi-message request (max 100)
+BATCH_ACK_WINDOW = float(os.getenv("BATCH_ACK_WINDOW", "2"))  # Seconds batch mode collects incoming files before forwarding and acknowledging them together
+INDEX_CHUNK_SIZE = int(os.getenv("INDEX_CHUNK_SIZE", "200"))  # Messages fetched per get_messages call by /index (max 200)
+INDEX_CONCURRENCY = int(os.getenv("INDEX_CONCURRENCY", "3"))  # get_messages calls /index keeps in flight
+
+# Delivery Configuration
+WORKERS = int(os.getenv("WORKERS", "16"))  # Pyrogram update handler workers
+MAX_CONCURRENT_TRANSMISSIONS = int(os.getenv("MAX_CONCURRENT_TRANSMISSIONS", "1"))  # Parallel media uploads/downloads
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "8"))  # File copies/batch chunks sent at the same time
+DELIVERY_QUEUE_LIMIT = int(os.getenv("DELIVERY_QUEUE_LIMIT", "1000"))  # Queued deliveries before new requests are refused
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "5"))  # Minimum seconds between edits of a progress message
+
+# Thumbnail Configuration
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "downloads")  # Where resized document thumbnails are kept
+THUMBNAIL_CACHE_SIZE = int(os.getenv("THUMBNAIL_CACHE_SIZE", str(50 * 1024 * 1024)))  # Bytes of thumbnails kept on disk
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # Threads resizing thumbnails off the event loop
+
+# Broadcast Configuration
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "20"))  # Messages in flight at once
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # Messages per second across all workers
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))  # Users read (and checkpointed) per page
+BROADCAST_STATUS_INTERVAL = int(os.getenv("BROADCAST_STATUS_INTERVAL", "10"))  # Seconds between status edits
 
 # Admin IDs - Convert space-separated string to list of integers
 ADMIN_IDS: List[int] = [
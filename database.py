@@ -1,68 +1,549 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DeleteMany, IndexModel, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from pymongo.monitoring import ConnectionPoolListener
+from collections import defaultdict
 from datetime import datetime
+from utils.bloom import BloomFilter
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
+from storage import Storage, STATS_FIELDS, new_file_document, new_batch_document, delivery_delete_at
 import config
-from typing import Dict, Any, Optional, List
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
 
+logger = logging.getLogger(__name__)
+
+# _id of the single document in `counters` holding the materialized /stats totals
+STATS_ID = "global"
+
+# Server error when an index exists with the same keys but other options (e.g. a new TTL)
+INDEX_OPTIONS_CONFLICT = 85
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Track connection pool usage from pymongo's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+
+    def _add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"open": self.open, "in_use": self.in_use, "waiting": self.waiting}
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+
+
+class WriteBuffer:
+    """Coalesce counter and bookkeeping writes and flush them with bulk_write"""
+
+    def __init__(self, db, max_ops: int):
+        self.db = db
+        self.max_ops = max_ops
+        self.pending = 0
+        self.full = asyncio.Event()
+        self._updates: Dict[Tuple[str, tuple], Dict[str, Any]] = {}
+        self._requests: Dict[str, list] = defaultdict(list)  # Inserts/deletes, never merged
+        self._lock = asyncio.Lock()
+
+    def _queued(self) -> None:
+        self.pending += 1
+        if self.pending >= self.max_ops:
+            self.full.set()
+
+    def update(
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        inc: Optional[Dict[str, int]] = None,
+        set: Optional[Dict[str, Any]] = None,
+        set_on_insert: Optional[Dict[str, Any]] = None,
+        push: Optional[Dict[str, Any]] = None,
+        upsert: bool = False
+    ) -> None:
+        """Merge an update into any pending one for the same document"""
+        key = (collection, tuple(sorted(query.items())))
+        entry = self._updates.get(key)
+        if entry is None:
+            entry = self._updates[key] = {
+                "query": query, "inc": {}, "set": {}, "set_on_insert": {}, "push": {}, "upsert": False
+            }
+        for field, value in (inc or {}).items():
+            entry["inc"][field] = entry["inc"].get(field, 0) + value
+        entry["set"].update(set or {})
+        for field, value in (set_on_insert or {}).items():
+            entry["set_on_insert"].setdefault(field, value)
+        for field, value in (push or {}).items():
+            entry["push"].setdefault(field, []).append(value)
+        entry["upsert"] = entry["upsert"] or upsert
+        self._queued()
+
+    def insert(self, collection: str, document: Dict[str, Any]) -> None:
+        self._requests[collection].append(InsertOne(document))
+        self._queued()
+
+    def delete(self, collection: str, query: Dict[str, Any]) -> None:
+        self._requests[collection].append(DeleteMany(query))
+        self._queued()
+
+    async def flush(self) -> Dict[str, Any]:
+        """Write everything queued so far, one unordered bulk_write per collection"""
+        async with self._lock:
+            updates, self._updates = self._updates, {}
+            requests, self._requests = self._requests, defaultdict(list)
+            self.pending = 0
+            self.full.clear()
+
+            for (collection, _), entry in updates.items():
+                update = {}
+                if entry["inc"]:
+                    update["$inc"] = entry["inc"]
+                if entry["set"]:
+                    update["$set"] = entry["set"]
+                if entry["set_on_insert"]:
+                    update["$setOnInsert"] = entry["set_on_insert"]
+                if entry["push"]:
+                    update["$push"] = {
+                        field: {"$each": values} for field, values in entry["push"].items()
+                    }
+                if update:
+                    requests[collection].append(UpdateOne(entry["query"], update, upsert=entry["upsert"]))
+
+            results = {}
+            for collection, ops in requests.items():
+                try:
+                    results[collection] = await self.db[collection].bulk_write(ops, ordered=False)
+                except BulkWriteError as e:
+                    logger.error(f"Buffered writes to {collection} partially failed: {e.details.get('writeErrors')}")
+                except Exception as e:
+                    logger.error(f"Buffered writes to {collection} failed: {e}")
+            return results
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Collect every stage name found in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+class Database(Storage):
+    """MongoDB backend used in production"""
 
-class Database:
     def __init__(self):
-        self.client = AsyncIOMotorClient(config.MONGO_URI)
+        self.pool_monitor = PoolMonitor()
+        self.client = AsyncIOMotorClient(
+            config.MONGO_URI,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            compressors=config.MONGO_COMPRESSORS,
+            event_listeners=[self.pool_monitor]
+        )
         self.db = self.client[config.DATABASE_NAME]
         self.files = self.db.files
         self.users = self.db.users
         self.batches = self.db.batches  # Collection for batches
+        self.counters = self.db.counters  # Materialized statistics
+        self.deliveries = self.db.deliveries  # One document per file copy sent to a user
+        self.delivery_jobs = self.db.delivery_jobs  # Progress of batch deliveries, for resuming
+        self.scheduled_deletions = self.db.scheduled_deletions  # Auto-delete queue, ordered by due_at
+        self.broadcasts = self.db.broadcasts  # Broadcast progress checkpoints
+        self.write_buffer = WriteBuffer(self.db, config.WRITE_BUFFER_MAX_OPS)
+        self.file_cache = TTLCache(config.CACHE_MAX_SIZE, config.CACHE_TTL)
+        self.batch_cache = TTLCache(config.CACHE_MAX_SIZE, config.CACHE_TTL)
+        self.lookups = SingleFlight()  # Coalesces concurrent cache misses per (type, id)
+        self.missing_ids = TTLCache(config.CACHE_MAX_SIZE, config.NEGATIVE_CACHE_TTL)
+        self.known_ids: Optional[BloomFilter] = None  # Every stored uuid/batch_id, once built
+        self._building_ids: Optional[BloomFilter] = None
+        self.rejected_lookups = 0
+        self.seen_users = TTLCache(config.SEEN_USERS_MAX_SIZE, config.SEEN_USERS_TTL)  # user_id -> last write
+        self._tasks: List[asyncio.Task] = []
         print("Database Connected Successfully!")
 
-    async def add_file(self, file_data: Dict[str, Any]) -> str:
-        file_doc = {
-            "file_id": file_data["file_id"],
-            "file_name": file_data["file_name"],
-            "file_size": file_data["file_size"],
-            "file_type": file_data["file_type"],
-            "uuid": file_data["uuid"],
-            "uploader_id": file_data["uploader_id"],
-            "message_id": file_data["message_id"],
-            "downloads": 0,
-            "auto_delete": file_data.get("auto_delete", False),
-            "auto_delete_time": file_data.get("auto_delete_time", None),
-            "uploaded_at": datetime.utcnow(),
-            "batch_id": file_data.get("batch_id", None),  # For batch association
-            "active_messages": []  # Track message instances across chats
+    def pool_stats(self) -> Dict[str, int]:
+        """Open, in-use and waiting connection counts of the shared pool"""
+        return self.pool_monitor.stats()
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "files": self.file_cache.stats(),
+            "batches": self.batch_cache.stats(),
+            "missing": self.missing_ids.stats()
         }
+
+    async def start(self) -> None:
+        """Prepare indexes and launch the background maintenance jobs"""
+        await self.ensure_indexes()
+        if config.CHECK_INDEXES:
+            await self.check_indexes()
+        if await self.counters.find_one({"_id": STATS_ID}, {"_id": 1}) is None:
+            # Built before any buffered $inc can create a near-empty counters document
+            await self.reconcile_stats()
+        self._tasks.append(asyncio.create_task(self.build_known_ids()))
+        self._tasks.append(asyncio.create_task(self._reconcile_stats_loop()))
+        self._tasks.append(asyncio.create_task(self._flush_writes_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.flush_writes()
+        self.client.close()
+
+    async def flush_writes(self) -> None:
+        """Persist buffered writes, then count the users they created"""
+        results = await self.write_buffer.flush()
+        if "users" in results and results["users"].upserted_count:
+            self._bump_stats(total_users=results["users"].upserted_count)
+            await self.write_buffer.flush()
+
+    async def _flush_writes_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.write_buffer.full.wait(), config.WRITE_BUFFER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush_writes()
+            except Exception as e:
+                logger.error(f"Write buffer flush failed: {e}")
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes backing every lookup the handlers issue"""
+        await self.files.create_indexes([
+            IndexModel([("uuid", ASCENDING)], unique=True),
+            IndexModel([("batch_id", ASCENDING)]),
+            IndexModel([("auto_delete", ASCENDING)]),
+            IndexModel(
+                [("file_unique_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"file_unique_id": {"$type": "string"}}  # Records not yet backfilled
+            )
+        ])
+        await self.batches.create_indexes([
+            IndexModel([("batch_id", ASCENDING)], unique=True),
+            IndexModel([("created_by", ASCENDING)]),
+            IndexModel([("status", ASCENDING)])
+        ])
+        await self._ensure_ttl_index(
+            self.batches,
+            "updated_at",
+            config.BATCH_DRAFT_TTL,
+            partialFilterExpression={"status": "draft"}  # Published batches never expire
+        )
+        await self.users.create_indexes([
+            IndexModel([("user_id", ASCENDING)], unique=True),
+            IndexModel([("dead_reason", ASCENDING), ("user_id", ASCENDING)]),  # Live-audience pages
+            IndexModel([("last_active", ASCENDING)])  # Activity segments
+        ])
+        await self.deliveries.create_indexes([
+            IndexModel([("delete_at", ASCENDING)], expireAfterSeconds=0),
+            IndexModel([("uuid", ASCENDING), ("delete_at", ASCENDING)]),
+            IndexModel([("chat_id", ASCENDING), ("message_id", ASCENDING)])
+        ])
+        await self.scheduled_deletions.create_indexes([
+            IndexModel([("due_at", ASCENDING)])
+        ])
+        await self.broadcasts.create_indexes([
+            IndexModel([("broadcast_id", ASCENDING)], unique=True),
+            IndexModel([("status", ASCENDING)])
+        ])
+        await self.delivery_jobs.create_indexes([
+            IndexModel([("job_id", ASCENDING)], unique=True)
+        ])
+        await self._ensure_ttl_index(self.delivery_jobs, "updated_at", config.BATCH_JOB_TTL)
+        print("Database Indexes Ready!")
+
+    async def _ensure_ttl_index(self, collection, field: str, seconds: int, **options: Any) -> None:
+        """Create a TTL index, or retune the existing one when its configured expiry has changed"""
+        try:
+            await collection.create_indexes([
+                IndexModel([(field, ASCENDING)], expireAfterSeconds=seconds, **options)
+            ])
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            await self.db.command(
+                "collMod",
+                collection.name,
+                index={"keyPattern": {field: ASCENDING}, "expireAfterSeconds": seconds}
+            )
+            logger.info(f"Changed {collection.name}.{field} expiry to {seconds}s")
+
+    async def check_indexes(self) -> None:
+        """Explain each handler query and fail if any of them is a COLLSCAN"""
+        queries = [
+            ("files.uuid", self.files, {"uuid": ""}),
+            ("files.file_unique_id", self.files, {"file_unique_id": ""}),
+            ("files.batch_id", self.files, {"batch_id": ""}),
+            ("files.auto_delete", self.files, {"auto_delete": True}),
+            ("batches.batch_id", self.batches, {"batch_id": ""}),
+            ("batches.created_by", self.batches, {"created_by": 0}),
+            ("batches.status", self.batches, {"status": "draft"}),
+            ("users.user_id", self.users, {"user_id": 0}),
+            ("users.dead_reason", self.users, {"dead_reason": None, "user_id": {"$gt": 0}}),
+            ("users.last_active", self.users, {"last_active": {"$gte": datetime.utcnow()}}),
+            ("deliveries.uuid", self.deliveries, {"uuid": "", "delete_at": {"$gt": datetime.utcnow()}}),
+            ("scheduled_deletions.due_at", self.scheduled_deletions, {"due_at": {"$lte": datetime.utcnow()}}),
+            ("delivery_jobs.job_id", self.delivery_jobs, {"job_id": ""}),
+            ("broadcasts.status", self.broadcasts, {"status": "running"})
+        ]
+
+        failed = []
+        for name, collection, query in queries:
+            plan = await collection.find(query).explain()
+            if "COLLSCAN" in _plan_stages(plan.get("queryPlanner", {})):
+                failed.append(name)
+
+        if failed:
+            raise RuntimeError(f"Queries without index support: {', '.join(failed)}")
+        print("Database Index Check Passed!")
+
+    async def build_known_ids(self) -> None:
+        """Stream every uuid and batch_id into a Bloom filter of known ids"""
+        try:
+            expected = (
+                await self.files.estimated_document_count()
+                + await self.batches.estimated_document_count()
+            )
+            self._building_ids = BloomFilter(max(config.BLOOM_CAPACITY, expected * 2), config.BLOOM_ERROR_RATE)
+
+            async for file in self.files.find({}, {"uuid": 1, "_id": 0}, batch_size=5000):
+                if file.get("uuid"):
+                    self._building_ids.add(f"file:{file['uuid']}")
+            async for batch in self.batches.find({}, {"batch_id": 1, "_id": 0}, batch_size=5000):
+                if batch.get("batch_id"):
+                    self._building_ids.add(f"batch:{batch['batch_id']}")
+
+            self.known_ids, self._building_ids = self._building_ids, None
+            logger.info(f"Known id filter built with {self.known_ids.count} ids")
+        except Exception as e:
+            self._building_ids = None
+            logger.error(f"Failed to build known id filter: {e}")
+
+    def _remember_id(self, kind: str, value: str) -> None:
+        key = f"{kind}:{value}"
+        self.missing_ids.pop(key)
+        for bloom in (self.known_ids, self._building_ids):
+            if bloom is not None:
+                bloom.add(key)
+
+    def _is_missing(self, kind: str, value: str) -> bool:
+        """True when the id is certainly absent, without touching the database"""
+        key = f"{kind}:{value}"
+        if self.known_ids is not None and key not in self.known_ids:
+            self.rejected_lookups += 1
+            return True
+        return self.missing_ids.get(key) is not None
+
+    async def add_file(self, file_data: Dict[str, Any]) -> str:
+        file_doc = new_file_document(file_data)
         await self.files.insert_one(file_doc)
+        self._remember_id("file", file_doc["uuid"])
+        self._bump_stats(
+            total_files=1,
+            total_size=file_doc["file_size"] or 0,
+            active_autodelete_files=1 if file_doc["auto_delete"] else 0
+        )
         return file_doc["uuid"]
 
+    async def add_files(self, files: List[Dict[str, Any]]) -> List[str]:
+        """Insert many files with one unordered insert_many; duplicates are skipped, not fatal"""
+        file_docs = [new_file_document(file_data) for file_data in files]
+        if not file_docs:
+            return []
+        failed = set()
+        try:
+            await self.files.insert_many(file_docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"{len(failed)} of {len(file_docs)} files were not inserted")
+
+        stored = [file_doc for index, file_doc in enumerate(file_docs) if index not in failed]
+        for file_doc in stored:
+            self._remember_id("file", file_doc["uuid"])
+        self._bump_stats(
+            total_files=len(stored),
+            total_size=sum(file_doc["file_size"] or 0 for file_doc in stored),
+            active_autodelete_files=sum(1 for file_doc in stored if file_doc["auto_delete"])
+        )
+        return [file_doc["uuid"] for file_doc in stored]
+
+    async def get_file_by_unique_id(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        return await self.files.find_one({"file_unique_id": file_unique_id}, {"active_messages": 0})
+
+    async def get_files_by_unique_ids(self, file_unique_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not file_unique_ids:
+            return {}
+        cursor = self.files.find({"file_unique_id": {"$in": list(set(file_unique_ids))}}, {"active_messages": 0})
+        return {file["file_unique_id"]: file async for file in cursor}
+
+    async def get_files_missing_unique_id(self, after_uuid: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"file_unique_id": None}
+        if after_uuid is not None:
+            query["uuid"] = {"$gt": after_uuid}
+        cursor = self.files.find(query, {"_id": 0, "uuid": 1, "message_id": 1}).sort("uuid", ASCENDING).limit(limit)
+        return await cursor.to_list(None)
+
+    async def set_file_unique_ids(self, unique_ids: Dict[str, str]) -> int:
+        if not unique_ids:
+            return 0
+        requests = [
+            UpdateOne({"uuid": uuid}, {"$set": {"file_unique_id": file_unique_id}})
+            for uuid, file_unique_id in unique_ids.items()
+        ]
+        try:
+            result = await self.files.bulk_write(requests, ordered=False)
+            updated = result.modified_count
+        except BulkWriteError as e:
+            # Duplicates of an already registered media keep a null id
+            updated = e.details.get("nModified", 0)
+        for uuid in unique_ids:
+            self.file_cache.pop(uuid)
+        return updated
+
     async def get_file(self, uuid: str) -> Optional[Dict[str, Any]]:
-        return await self.files.find_one({"uuid": uuid})
+        file = self.file_cache.get(uuid)
+        if file is None:
+            if self._is_missing("file", uuid):
+                return None
+            file = await self.lookups.do(("file", uuid), lambda: self._load_file(uuid))
+        return file
 
-    async def increment_downloads(self, uuid: str) -> None:
-        await self.files.update_one(
+    async def _load_file(self, uuid: str) -> Optional[Dict[str, Any]]:
+        # Legacy documents may still carry an active_messages array; never ship it
+        file = await self.files.find_one({"uuid": uuid}, {"active_messages": 0})
+        if file:
+            self.file_cache.set(uuid, file)
+        else:
+            self.missing_ids.set(f"file:{uuid}", True)
+        return file
+
+    async def resolve_file_download(self, uuid: str) -> Optional[Dict[str, Any]]:
+        """Fetch the file and count the download in at most one round trip"""
+        file = self.file_cache.get(uuid)
+        if file is None:
+            if self._is_missing("file", uuid):
+                return None
+
+            counted = False
+
+            async def fetch_and_count():
+                nonlocal counted
+                counted = True
+                return await self._load_file_counting_download(uuid)
+
+            file = await self.lookups.do(("download", uuid), fetch_and_count)
+            if file is None:
+                return None
+            if counted:
+                self._bump_stats(total_downloads=1)
+                return file
+
+        # Served from cache, or shared another caller's lookup: count via the write buffer
+        await self.increment_downloads(uuid)
+        return file
+
+    async def _load_file_counting_download(self, uuid: str) -> Optional[Dict[str, Any]]:
+        file = await self.files.find_one_and_update(
             {"uuid": uuid},
             {
                 "$inc": {"downloads": 1},
                 "$set": {"last_download": datetime.utcnow()}
-            }
+            },
+            projection={"active_messages": 0},
+            return_document=ReturnDocument.AFTER
         )
+        if file:
+            self.file_cache.set(uuid, file)
+        else:
+            self.missing_ids.set(f"file:{uuid}", True)
+        return file
+
+    async def increment_downloads(self, uuid: str) -> None:
+        self.write_buffer.update(
+            "files",
+            {"uuid": uuid},
+            inc={"downloads": 1},
+            set={"last_download": datetime.utcnow()}
+        )
+        self._bump_stats(total_downloads=1)
 
     async def add_batch(self, batch_data: Dict[str, Any]) -> str:
         """Add a new batch of files"""
-        batch_doc = {
-            "batch_id": batch_data["batch_id"],
-            "created_by": batch_data["created_by"],
-            "total_files": batch_data["total_files"],
-            "created_at": datetime.utcnow(),
-            "downloads": 0,
-            "description": batch_data.get("description", ""),
-            "status": "active",
-            "files": batch_data.get("files", []),  # Store file references
-            "last_download": None
-        }
+        return await self.create_batch(new_batch_document(batch_data))
+
+    async def create_batch(self, batch_doc: Dict[str, Any]) -> str:
+        """Store a batch document built by the batch upload session as-is"""
         await self.batches.insert_one(batch_doc)
+        self._remember_id("batch", batch_doc["batch_id"])
+        self._bump_stats(total_batches=1)
         return batch_doc["batch_id"]
 
+    async def get_batch_data(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored batch document, including its embedded file list"""
+        batch = self.batch_cache.get(batch_id)
+        if batch is None:
+            if self._is_missing("batch", batch_id):
+                return None
+            batch = await self.lookups.do(("batch", batch_id), lambda: self._load_batch(batch_id))
+        return batch
+
+    async def _load_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await self.batches.find_one({"batch_id": batch_id, "status": {"$ne": "draft"}})
+        if batch:
+            self.batch_cache.set(batch_id, batch)
+        else:
+            self.missing_ids.set(f"batch:{batch_id}", True)
+        return batch
+
     async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """Get batch details and its associated files"""
-        batch = await self.batches.find_one({"batch_id": batch_id})
+        batch = await self.batches.find_one({"batch_id": batch_id, "status": {"$ne": "draft"}})
         if batch:
             # Get all files associated with this batch
             files = await self.files.find({"batch_id": batch_id}).to_list(None)
@@ -75,16 +556,16 @@ class Database:
 
     async def increment_batch_downloads(self, batch_id: str) -> None:
         """Increment batch download counter"""
-        await self.batches.update_one(
+        self.write_buffer.update(
+            "batches",
             {"batch_id": batch_id},
-            {
-                "$inc": {"downloads": 1},
-                "$set": {"last_download": datetime.utcnow()}
-            }
+            inc={"downloads": 1},
+            set={"last_download": datetime.utcnow()}
         )
+        self._bump_stats(batch_downloads=1)
 
     async def set_file_autodelete(self, uuid: str, delete_time: int) -> bool:
-        result = await self.files.update_one(
+        previous = await self.files.find_one_and_update(
             {"uuid": uuid},
             {
                 "$set": {
@@ -92,80 +573,179 @@ class Database:
                     "auto_delete_time": delete_time,
                     "delete_at": datetime.utcnow()
                 }
-            }
+            },
+            projection={"auto_delete": 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        self.file_cache.pop(uuid)
+        if previous is None:
+            return False
+        if not previous.get("auto_delete"):
+            self._bump_stats(active_autodelete_files=1)
+        return True
 
     async def get_autodelete_files(self) -> List[Dict[str, Any]]:
         return await self.files.find({"auto_delete": True}).to_list(None)
 
-    async def update_file_message_id(self, uuid: str, message_id: int, chat_id: int) -> None:
-        await self.files.update_one(
-            {"uuid": uuid},
+    async def record_delivery(
+        self,
+        uuid: str,
+        chat_id: int,
+        message_id: int,
+        delete_after: Optional[int] = None
+    ) -> None:
+        """Track a copy of a file sent to a chat; the TTL index drops it at delete_at"""
+        sent_at = datetime.utcnow()
+        self.write_buffer.insert("deliveries", {
+            "uuid": uuid,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "sent_at": sent_at,
+            "delete_at": delivery_delete_at(sent_at, delete_after)
+        })
+
+    async def get_live_deliveries(self, uuid: str) -> List[Dict[str, Any]]:
+        """Every copy of a file that has not reached its delete time yet"""
+        return await self.deliveries.find(
+            {"uuid": uuid, "delete_at": {"$gt": datetime.utcnow()}},
+            {"_id": 0}
+        ).to_list(None)
+
+    async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None:
+        self.write_buffer.delete("deliveries", {"chat_id": chat_id, "message_id": message_id})
+
+    async def remove_file_messages(self, messages: List[Tuple[int, int]]) -> None:
+        if messages:
+            await self.deliveries.bulk_write(
+                [DeleteMany({"chat_id": chat_id, "message_id": message_id}) for chat_id, message_id in messages],
+                ordered=False
+            )
+
+    async def add_scheduled_deletion(self, deletion: Dict[str, Any]) -> None:
+        await self.scheduled_deletions.insert_one(dict(deletion))
+
+    async def get_due_deletions(self, due_before: datetime, limit: int) -> List[Dict[str, Any]]:
+        return await self.scheduled_deletions.find(
+            {"due_at": {"$lte": due_before}}
+        ).sort("due_at", ASCENDING).limit(limit).to_list(None)
+
+    async def remove_scheduled_deletions(self, deletion_ids: List[str]) -> None:
+        if deletion_ids:
+            await self.scheduled_deletions.delete_many({"_id": {"$in": deletion_ids}})
+
+    async def save_delivery_job(self, job: Dict[str, Any]) -> None:
+        await self.delivery_jobs.replace_one(
+            {"job_id": job["job_id"]},
+            {**job, "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+
+    async def get_delivery_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.delivery_jobs.find_one({"job_id": job_id}, {"_id": 0})
+
+    async def update_delivery_job(self, job_id: str, cursor: int, sent_ids: List[int], failed: int) -> None:
+        """Persist progress right away (not buffered) so a crash loses at most one chunk"""
+        await self.delivery_jobs.update_one(
+            {"job_id": job_id},
             {
-                "$push": {
-                    "active_messages": {
-                        "chat_id": chat_id,
-                        "message_id": message_id,
-                        "sent_at": datetime.utcnow()
-                    }
-                }
+                "$set": {"cursor": cursor, "failed": failed, "updated_at": datetime.utcnow()},
+                "$push": {"sent_ids": {"$each": sent_ids}}
             }
         )
 
-    async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None:
-        await self.files.update_one(
-            {"uuid": uuid},
+    async def delete_delivery_job(self, job_id: str) -> None:
+        await self.delivery_jobs.delete_one({"job_id": job_id})
+
+    async def get_pending_delivery_jobs(self) -> List[Dict[str, Any]]:
+        return await self.delivery_jobs.find({}, {"_id": 0}).to_list(None)
+
+    def _bump_stats(self, **deltas: int) -> None:
+        deltas = {field: value for field, value in deltas.items() if value}
+        if deltas:
+            self.write_buffer.update("counters", {"_id": STATS_ID}, inc=deltas, upsert=True)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Read the materialized counters, building them on first use"""
+        await self.flush_writes()
+        counters = await self.counters.find_one({"_id": STATS_ID})
+        if counters is None:
+            return await self.reconcile_stats()
+        return {field: counters.get(field, 0) for field in STATS_FIELDS}
+
+    async def reconcile_stats(self) -> Dict[str, Any]:
+        """Recompute the counters server-side and overwrite any drift"""
+        file_totals = await self.files.aggregate([
             {
-                "$pull": {
-                    "active_messages": {
-                        "chat_id": chat_id,
-                        "message_id": message_id
+                "$group": {
+                    "_id": None,
+                    "total_files": {"$sum": 1},
+                    "total_size": {"$sum": "$file_size"},
+                    "total_downloads": {"$sum": "$downloads"},
+                    "active_autodelete_files": {
+                        "$sum": {"$cond": [{"$eq": ["$auto_delete", True]}, 1, 0]}
                     }
                 }
             }
-        )
+        ]).to_list(1)
+        batch_totals = await self.batches.aggregate([
+            {"$match": {"status": {"$ne": "draft"}}},
+            {
+                "$group": {
+                    "_id": None,
+                    "total_batches": {"$sum": 1},
+                    "batch_downloads": {"$sum": "$downloads"}
+                }
+            }
+        ]).to_list(1)
 
-    async def get_stats(self) -> Dict[str, Any]:
-        total_files = await self.files.count_documents({})
-        total_users = await self.users.count_documents({})
-        total_batches = await self.batches.count_documents({})
+        stats = {field: 0 for field in STATS_FIELDS}
+        for totals in file_totals + batch_totals:
+            totals.pop("_id", None)
+            stats.update(totals)
+        stats["total_users"] = await self.users.count_documents({})
 
-        total_size = 0
-        total_downloads = 0
-        batch_downloads = 0
+        await self.counters.update_one({"_id": STATS_ID}, {"$set": stats}, upsert=True)
+        return stats
 
-        async for file in self.files.find({}):
-            total_size += file.get("file_size", 0)
-            total_downloads += file.get("downloads", 0)
+    async def _reconcile_stats_loop(self) -> None:
+        while True:
+            await asyncio.sleep(config.STATS_RECONCILE_INTERVAL)
+            try:
+                await self.flush_writes()
+                await self.reconcile_stats()
+            except Exception as e:
+                logger.error(f"Stats reconcile failed: {e}")
 
-        async for batch in self.batches.find({}):
-            batch_downloads += batch.get("downloads", 0)
+    async def add_user(self, user_id: int, username: str = None) -> None:
+        """Register a user, writing last_active at most once per granularity window"""
+        now = time.monotonic()
+        last_write = self.seen_users.get(user_id)
+        if last_write is not None and now - last_write < config.USER_ACTIVITY_GRANULARITY:
+            return
+        self.seen_users.set(user_id, now)
 
-        return {
-            "total_files": total_files,
-            "total_users": total_users,
-            "total_size": total_size,
-            "total_downloads": total_downloads,
-            "total_batches": total_batches,
-            "batch_downloads": batch_downloads,
-            "active_autodelete_files": await self.files.count_documents({"auto_delete": True})
+        update = {
+            "set": {
+                "username": username,
+                "last_active": datetime.utcnow(),
+                "dead_reason": None  # Anyone who talks to the bot can be messaged again
+            },
+            "set_on_insert": {
+                "joined_date": datetime.utcnow()
+            }
         }
+        if last_write is not None:
+            self.write_buffer.update("users", {"user_id": user_id}, upsert=True, **update)
+            return
 
-    async def add_user(self, user_id: int, username: str = None) -> None:
-        await self.users.update_one(
+        # First sighting in this process: upsert right away so new users exist immediately
+        result = await self.users.update_one(
             {"user_id": user_id},
-            {
-                "$set": {
-                    "username": username,
-                    "last_active": datetime.utcnow()
-                },
-                "$setOnInsert": {
-                    "joined_date": datetime.utcnow()
-                }
-            },
+            {"$set": update["set"], "$setOnInsert": update["set_on_insert"]},
             upsert=True
         )
+        if result.upserted_id is not None:
+            self._bump_stats(total_users=1)
 
     async def update_user_activity(self, user_id: int) -> None:
         await self.users.update_one(
@@ -176,9 +756,53 @@ class Database:
     async def get_all_users(self) -> List[Dict[str, Any]]:
         return await self.users.find({}).to_list(None)
 
+    def _audience_query(self, active_since: Optional[datetime]) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"dead_reason": None}  # Also matches users who never had the field
+        if active_since is not None:
+            query["last_active"] = {"$gte": active_since}
+        return query
+
+    async def get_user_ids(
+        self,
+        after_user_id: Optional[int],
+        limit: int,
+        active_since: Optional[datetime] = None
+    ) -> List[int]:
+        """Keyset page over live users, projecting nothing but the id"""
+        query = self._audience_query(active_since)
+        if after_user_id is not None:
+            query["user_id"] = {"$gt": after_user_id}
+        cursor = self.users.find(query, {"_id": 0, "user_id": 1}).sort("user_id", ASCENDING).limit(limit)
+        return [user["user_id"] async for user in cursor]
+
+    async def count_users(self, active_since: Optional[datetime] = None) -> int:
+        return await self.users.count_documents(self._audience_query(active_since))
+
+    async def mark_users_dead(self, reasons: Dict[int, str]) -> None:
+        if not reasons:
+            return
+        now = datetime.utcnow()
+        await self.users.bulk_write(
+            [
+                UpdateOne({"user_id": user_id}, {"$set": {"dead_reason": reason, "dead_at": now}})
+                for user_id, reason in reasons.items()
+            ],
+            ordered=False
+        )
+
+    async def save_broadcast(self, broadcast: Dict[str, Any]) -> None:
+        await self.broadcasts.replace_one(
+            {"broadcast_id": broadcast["broadcast_id"]},
+            {**broadcast, "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        return await self.broadcasts.find({"status": "running"}, {"_id": 0}).to_list(None)
+
     async def get_user_batches(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all batches created by a user"""
-        return await self.batches.find({"created_by": user_id}).to_list(None)
+        return await self.batches.find({"created_by": user_id, "status": {"$ne": "draft"}}).to_list(None)
 
     async def update_batch_status(self, batch_id: str, status: str) -> None:
         """Update batch status (active/completed/cancelled)"""
@@ -186,6 +810,68 @@ class Database:
             {"batch_id": batch_id},
             {"$set": {"status": status}}
         )
+        self.batch_cache.pop(batch_id)
+
+    async def create_batch_draft(self, draft: Dict[str, Any]) -> None:
+        """Store a batch that is still being built; updated_at drives its idle expiry"""
+        await self.batches.insert_one({**draft, "updated_at": datetime.utcnow()})
+
+    async def update_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> None:
+        await self.batches.update_one(
+            {"batch_id": batch_id, "status": "draft"},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        )
+
+    async def append_batch_files(self, batch_id: str, files: List[Dict[str, Any]]) -> None:
+        """Add files to a draft as they arrive, so a restart does not lose them"""
+        if not files:
+            return
+        await self.batches.update_one(
+            {"batch_id": batch_id, "status": "draft"},
+            {
+                "$push": {"files": {"$each": files}},
+                "$inc": {"total_files": len(files)},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+
+    async def publish_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> bool:
+        """Make a draft visible to lookups; its files are already stored"""
+        result = await self.batches.update_one(
+            {"batch_id": batch_id, "status": "draft"},
+            {"$set": {**fields, "status": "active"}, "$unset": {"updated_at": ""}}
+        )
+        if not result.modified_count:
+            return False
+        self._remember_id("batch", batch_id)
+        self._bump_stats(total_batches=1)
+        return True
+
+    async def delete_batch_draft(self, batch_id: str) -> None:
+        await self.batches.delete_one({"batch_id": batch_id, "status": "draft"})
+
+    async def get_batch_drafts(self) -> List[Dict[str, Any]]:
+        return await self.batches.find({"status": "draft"}, {"_id": 0}).to_list(None)
+
+
+_database: Optional[Storage] = None
+
+
+def get_database() -> Storage:
+    """Return the process-wide storage backend selected by STORAGE_BACKEND, creating it on first use"""
+    global _database
+    if _database is None:
+        if config.STORAGE_BACKEND == "mongo":
+            _database = Database()
+        elif config.STORAGE_BACKEND == "memory":
+            from storage.memory import MemoryStorage
+            _database = MemoryStorage()
+        elif config.STORAGE_BACKEND == "sqlite":
+            from storage.sqlite import SQLiteStorage
+            _database = SQLiteStorage(config.SQLITE_PATH)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {config.STORAGE_BACKEND}")
+    return _database
 
 # Last updated: 2025-03-16 07:46:05
 # Updated by: utkarsh212646
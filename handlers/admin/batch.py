@@ -1,31 +1,27 @@
 from pyrogram import Client, filters
-from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from database import Database
+from pyrogram.types import Message, CallbackQuery
+from database import get_database
 from datetime import datetime
 import logging
 import uuid
 import asyncio
 import os
 from typing import Dict, List, Optional, Union
-from utils import format_bytes, get_file_type, generate_thumbnail
+from utils import get_file_type
 import config
-from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.errors import MessageNotModified, RPCError
 from utils.decorators import admin_check
+from handlers.utils.flood_wait import call_with_flood_wait
+from handlers.utils.batch_sessions import BatchSession, BATCH_KEYBOARD, batch_session_store, render_panel
+from collections import defaultdict
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = get_database()
 
-class BatchSession:
-    def __init__(self):
-        self.batch_id = str(uuid.uuid4())
-        self.files = []
-        self.start_time = datetime.utcnow()
-        self.description = ""
-        self.current_message = None
-        self.auto_delete = False
-        self.auto_delete_time = config.DEFAULT_DELETE_TIME
+batch_sessions = batch_session_store.sessions
 
-batch_sessions: Dict[int, BatchSession] = {}
+# Telegram accepts at most 100 message ids per forward request
+MAX_FORWARD_IDS = 100
 
 @Client.on_message(filters.command("batch") & filters.private & admin_check)
 async def start_batch(client: Client, message: Message):
@@ -35,20 +31,8 @@ async def start_batch(client: Client, message: Message):
         await message.reply_text("❌ You already have an active batch session!\nUse /cancel to stop the current session.")
         return
     
-    batch_sessions[user_id] = BatchSession()
-    
-    keyboard = InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton("Add Description", callback_data="batch_add_desc"),
-            InlineKeyboardButton("Toggle Auto-Delete", callback_data="batch_toggle_delete")
-        ],
-        [
-            InlineKeyboardButton("✅ Done", callback_data="batch_done"),
-            InlineKeyboardButton("❌ Cancel", callback_data="batch_cancel")
-        ]
-    ])
-    
-    batch_sessions[user_id].current_message = await message.reply_text(
+    session = await batch_session_store.open(user_id)
+    session.current_message = await message.reply_text(
         "📦 Batch Upload Mode Started!\n\n"
         "• Send me the files one by one\n"
         "• I'll forward them to the DB channel\n"
@@ -56,37 +40,13 @@ async def start_batch(client: Client, message: Message):
         "Status: Ready to receive files ✅\n"
         "Auto-Delete: ❌ Disabled\n"
         "Files: 0",
-        reply_markup=keyboard
+        reply_markup=BATCH_KEYBOARD
     )
+    await batch_session_store.save(session)
 
 async def update_batch_message(session: BatchSession, message: Message):
     try:
-        keyboard = InlineKeyboardMarkup([
-            [
-                InlineKeyboardButton("Add Description", callback_data="batch_add_desc"),
-                InlineKeyboardButton("Toggle Auto-Delete", callback_data="batch_toggle_delete")
-            ],
-            [
-                InlineKeyboardButton("✅ Done", callback_data="batch_done"),
-                InlineKeyboardButton("❌ Cancel", callback_data="batch_cancel")
-            ]
-        ])
-        
-        text = (
-            "📦 Batch Upload Mode\n\n"
-            f"• Files Received: {len(session.files)}\n"
-            f"• Auto-Delete: {'✅ Enabled' if session.auto_delete else '❌ Disabled'}\n"
-        )
-        
-        if session.auto_delete:
-            text += f"• Delete After: {session.auto_delete_time} minutes\n"
-            
-        if session.description:
-            text += f"\nDescription: {session.description}\n"
-            
-        text += "\nStatus: Receiving files ✅"
-        
-        await message.edit_text(text, reply_markup=keyboard)
+        await message.edit_text(render_panel(session), reply_markup=BATCH_KEYBOARD)
     except MessageNotModified:
         pass
     except Exception as e:
@@ -112,6 +72,7 @@ async def handle_batch_callbacks(client: Client, callback_query: CallbackQuery):
         
     elif data == "batch_toggle_delete":
         session.auto_delete = not session.auto_delete
+        await batch_session_store.save(session)
         await update_batch_message(session, callback_query.message)
         await callback_query.answer(
             f"Auto-delete {'enabled' if session.auto_delete else 'disabled'}!",
@@ -126,7 +87,7 @@ async def handle_batch_callbacks(client: Client, callback_query: CallbackQuery):
         await finish_batch(client, callback_query.message, user_id)
         
     elif data == "batch_cancel":
-        del batch_sessions[user_id]
+        await batch_session_store.discard(user_id)
         await callback_query.message.edit_text("❌ Batch upload cancelled!")
         
     await callback_query.answer()
@@ -134,20 +95,16 @@ async def handle_batch_callbacks(client: Client, callback_query: CallbackQuery):
 async def finish_batch(client: Client, message: Message, user_id: int):
     session = batch_sessions[user_id]
     
+    # Waits out a flush already in progress, then ingests whatever is left
+    await flush_pending(client, session)
+    if session.pending:
+        # Not published without them; the session stays open so Done can be pressed again
+        return
+    
     try:
-        batch_data = {
-            "batch_id": session.batch_id,
-            "created_by": user_id,
-            "total_files": len(session.files),
-            "files": session.files,
-            "creation_time": datetime.utcnow(),
-            "downloads": 0,
-            "description": session.description,
-            "auto_delete": session.auto_delete,
-            "auto_delete_time": session.auto_delete_time
-        }
-        
-        await db.batches.insert_one(batch_data)
+        # Files were stored as they arrived; publishing only flips the draft's status
+        if not await batch_session_store.publish(session):
+            raise RuntimeError("batch draft expired")
         
         bot_username = (await client.get_me()).username
         batch_link = f"https://t.me/{bot_username}?start=batch_{session.batch_id}"
@@ -174,7 +131,7 @@ async def finish_batch(client: Client, message: Message, user_id: int):
         await message.edit_text("❌ Failed to create batch")
     
     finally:
-        del batch_sessions[user_id]
+        await batch_session_store.discard(user_id)
 
 @Client.on_message(filters.private & ~filters.command(["batch", "cancel"]) & admin_check)
 async def handle_batch_file(client: Client, message: Message):
@@ -185,7 +142,7 @@ async def handle_batch_file(client: Client, message: Message):
         
     session = batch_sessions[user_id]
     
-    if hasattr(session, 'awaiting_description') and session.awaiting_description:
+    if session.awaiting_description:
         if message.text == "/cancel":
             session.awaiting_description = False
             await message.reply_text("❌ Description cancelled!")
@@ -193,6 +150,7 @@ async def handle_batch_file(client: Client, message: Message):
             
         session.description = message.text
         session.awaiting_description = False
+        await batch_session_store.save(session)
         await message.reply_text("✅ Description added!")
         await update_batch_message(session, session.current_message)
         return
@@ -200,41 +158,148 @@ async def handle_batch_file(client: Client, message: Message):
     if not message.media:
         return
     
-    try:
-        file_type = get_file_type(message)
-        if not file_type:
-            await message.reply_text("❌ Unsupported file type!")
+    if not get_file_type(message):
+        await message.reply_text("❌ Unsupported file type!")
+        return
+    
+    # Collected and acknowledged together: albums arrive as one update per file
+    session.pending.append(message)
+    if session.flush_task is None or session.flush_task.done():
+        session.flush_task = asyncio.create_task(flush_later(client, session))
+
+async def flush_later(client: Client, session: BatchSession):
+    # Files that arrive during the panel edit find this task still running, so it flushes them too
+    while True:
+        await asyncio.sleep(config.BATCH_ACK_WINDOW)
+        if not await flush_pending(client, session) or not session.pending:
             return
-            
-        forwarded = await message.forward(chat_id=config.DB_CHANNEL_ID)
+
+async def flush_pending(client: Client, session: BatchSession) -> bool:
+    """Ingest everything received so far, then refresh the panel once; False if some files failed"""
+    saved = True
+    async with session.lock:
+        while session.pending:
+            messages, session.pending = sorted(session.pending, key=lambda msg: msg.id), []
+            try:
+                await ingest_messages(client, session, messages)
+            except Exception as e:
+                logger.error(f"Failed to process files: {e}")
+                # Retried by the next flush; session.forwarded keeps them from being forwarded twice
+                session.pending = messages + session.pending
+                await session.current_message.reply_text(
+                    f"❌ Failed to save {len(messages)} file(s), they will be retried with the next file or ✅ Done"
+                )
+                saved = False
+                break
+        await update_batch_message(session, session.current_message)
+    return saved
+
+async def forward_group(client: Client, messages: List[Message], channel_ids: Dict[int, int]):
+    """Forward messages from one chat with one request per 100, recording source id -> channel id as they go"""
+    for start in range(0, len(messages), MAX_FORWARD_IDS):
+        chunk = messages[start:start + MAX_FORWARD_IDS]
+        forwarded = await call_with_flood_wait(
+            lambda: client.forward_messages(
+                chat_id=config.DB_CHANNEL_ID,
+                from_chat_id=chunk[0].chat.id,
+                message_ids=[msg.id for msg in chunk]
+            )
+        )
+        if not isinstance(forwarded, list):
+            forwarded = [forwarded]
+        if len(forwarded) == len(chunk):
+            # Copies keep the order of their sources, so ascending ids pair up
+            for source, copy in zip(chunk, sorted(forwarded, key=lambda msg: msg.id)):
+                channel_ids[source.id] = copy.id
+            continue
         
+        # Some sources were skipped (e.g. deleted meanwhile), so order no longer tells
+        # which copy is which: drop the copies and forward one at a time instead
+        logger.warning(f"Forwarded {len(forwarded)} of {len(chunk)} messages, retrying one by one")
+        if forwarded:
+            await call_with_flood_wait(
+                lambda: client.delete_messages(config.DB_CHANNEL_ID, [msg.id for msg in forwarded])
+            )
+        for source in chunk:
+            try:
+                copy = await call_with_flood_wait(
+                    lambda: client.forward_messages(
+                        chat_id=config.DB_CHANNEL_ID,
+                        from_chat_id=source.chat.id,
+                        message_ids=[source.id]
+                    )
+                )
+            except RPCError as e:
+                logger.warning(f"Failed to forward message {source.id}: {e}")
+                continue
+            if copy:
+                channel_ids[source.id] = copy[0].id
+
+async def ingest_messages(client: Client, session: BatchSession, messages: List[Message]):
+    unique_ids = {
+        message.id: getattr(getattr(message, get_file_type(message), None), "file_unique_id", None)
+        for message in messages
+    }
+    known_files = await db.get_files_by_unique_ids([unique_id for unique_id in unique_ids.values() if unique_id])
+    
+    existing = {}
+    groups: Dict[Optional[str], List[Message]] = defaultdict(list)
+    for message in messages:
+        known = known_files.get(unique_ids[message.id])
+        if known:
+            # Already in the DB channel: reuse that message instead of forwarding again
+            existing[message.id] = known["message_id"]
+        elif message.id not in session.forwarded:
+            groups[message.media_group_id].append(message)
+    
+    for group in groups.values():
+        await forward_group(client, group, session.forwarded)
+    channel_ids = {**session.forwarded, **existing}
+    
+    records = []
+    files = []
+    for message in messages:
+        if message.id not in channel_ids:
+            continue
+        file_type = get_file_type(message)
+        media = getattr(message, file_type, None)
         file_data = {
-            "message_id": forwarded.id,
-            "file_name": getattr(message.document, "file_name", None) or f"file_{len(session.files) + 1}",
+            "message_id": channel_ids[message.id],
+            "file_name": getattr(message.document, "file_name", None) or f"file_{len(session.files) + len(files) + 1}",
             "file_size": getattr(message.document, "file_size", 0),
             "mime_type": getattr(message.document, "mime_type", ""),
             "file_type": file_type,
             "upload_time": datetime.utcnow()
         }
         
-        if message.document and message.document.thumbs:
-            file_data["thumbnail"] = await generate_thumbnail(message)
-        
-        session.files.append(file_data)
-        
-        await message.reply_text(
-            f"✅ File received ({len(session.files)})\n"
-            f"📁 Name: {file_data['file_name']}\n"
-            f"📊 Size: {format_bytes(file_data['file_size'])}"
-        )
+        if message.id not in existing and media:
+            # Register the new channel message so later uploads of the same media find it
+            records.append({
+                "file_id": media.file_id,
+                "file_unique_id": getattr(media, "file_unique_id", None),
+                "file_name": file_data["file_name"],
+                "file_size": getattr(media, "file_size", 0) or 0,
+                "file_type": file_type,
+                "uuid": str(uuid.uuid4()),
+                "uploader_id": message.from_user.id,
+                "message_id": file_data["message_id"],
+                "auto_delete": session.auto_delete,
+                "auto_delete_time": session.auto_delete_time,
+                "batch_id": session.batch_id
+            })
         
-        await update_batch_message(session, session.current_message)
+        if message.document and message.document.thumbs:
+            # Enough for thumbnail_store.get(client, thumbnail_id, thumbnail_file_id) to
+            # fetch it on demand, and to recreate it after the LRU evicts the file
+            file_data["thumbnail_id"] = message.document.file_unique_id
+            file_data["thumbnail_file_id"] = message.document.thumbs[0].file_id
         
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-    except Exception as e:
-        logger.error(f"Failed to process file: {e}")
-        await message.reply_text("❌ Failed to process file")
+        files.append(file_data)
+    
+    await db.add_files(records)
+    await batch_session_store.add_files(session, files)
+    for message in messages:
+        session.forwarded.pop(message.id, None)
 
 @Client.on_message(filters.command("cancel") & filters.private & admin_check)
 async def cancel_batch(client: Client, message: Message):
@@ -244,5 +309,5 @@ async def cancel_batch(client: Client, message: Message):
         await message.reply_text("❌ No active batch session!")
         return
         
-    del batch_sessions[user_id]
+    await batch_session_store.discard(user_id)
     await message.reply_text("❌ Batch upload cancelled!")
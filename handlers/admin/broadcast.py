@@ -1,10 +1,11 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
+from database import get_database
 from utils import is_admin
-import asyncio
+from handlers.utils.broadcast import new_broadcast, start_broadcast
+from datetime import datetime, timedelta
 
-db = Database()
+db = get_database()
 
 @Client.on_message(filters.command("broadcast") & filters.reply)
 async def broadcast_command(client: Client, message: Message):
@@ -16,31 +17,17 @@ async def broadcast_command(client: Client, message: Message):
     if not replied_msg:
         await message.reply_text("❌ Please reply to a message to broadcast!")
         return
-    
+
+    # /broadcast <days> only targets users active within the last <days> days
+    active_since = None
+    if len(message.command) > 1:
+        if not message.command[1].isdigit():
+            await message.reply_text("❌ Usage: reply with /broadcast [active_days]")
+            return
+        active_since = datetime.utcnow() - timedelta(days=int(message.command[1]))
+
     status_msg = await message.reply_text("🔄 Broadcasting message...")
-    users = await db.get_all_users()
-    success = 0
-    failed = 0
-    
-    for user in users:
-        try:
-            if replied_msg.text:
-                await client.send_message(user["user_id"], replied_msg.text)
-            elif replied_msg.media:
-                await client.copy_message(
-                    chat_id=user["user_id"],
-                    from_chat_id=replied_msg.chat.id,
-                    message_id=replied_msg.message_id
-                )
-            success += 1
-        except:
-            failed += 1
-        await asyncio.sleep(0.1)
-    
-    broadcast_text = (
-        "✅ **Broadcast Completed**\n\n"
-        f"✓ Success: {success}\n"
-        f"× Failed: {failed}\n"
-        f"📊 Total: {success + failed}"
-    )
-    await status_msg.edit_text(broadcast_text)
\ No newline at end of file
+    total = await db.count_users(active_since)
+    broadcast = new_broadcast(replied_msg.chat.id, replied_msg.id, status_msg.id, total, active_since)
+    await db.save_broadcast(broadcast)
+    start_broadcast(client, broadcast)
@@ -0,0 +1,214 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from database import get_database
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from utils import is_admin, humanbytes, get_media_info, ProgressReporter
+from handlers.utils.flood_wait import call_with_flood_wait
+import asyncio
+import logging
+import uuid
+import config
+
+logger = logging.getLogger(__name__)
+db = get_database()
+
+# Telegram returns at most 200 messages per get_messages call
+MAX_INDEX_CHUNK = 200
+
+USAGE = (
+    "❌ **Usage:** `/index <first_id> <last_id> [batch]`\n\n"
+    "Registers every file in that DB channel message range.\n"
+    "Add `batch` to also group them into one batch link."
+)
+
+
+def build_file_record(message: Message, uploader_id: int, batch_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """File record for a message already in the DB channel, or None if it has no media"""
+    media = get_media_info(message) if not message.empty else None
+    if not media or not media["file_id"]:
+        return None
+    return {
+        "file_id": media["file_id"],
+        "file_unique_id": media["file_unique_id"],
+        "file_name": media["file_name"],
+        "file_size": media["file_size"] or 0,
+        "file_type": media["type"],
+        "mime_type": media["mime_type"],
+        "uuid": str(uuid.uuid4()),
+        "uploader_id": uploader_id,
+        "message_id": message.id,
+        "auto_delete": True,
+        "auto_delete_time": getattr(config, 'DEFAULT_AUTO_DELETE', 30),
+        "batch_id": batch_id
+    }
+
+
+@Client.on_message(filters.command("index"))
+async def index_command(client: Client, message: Message):
+    if not is_admin(message):
+        await message.reply_text("⚠️ You are not authorized to index files!")
+        return
+
+    args = message.command[1:]
+    valid = len(args) in (2, 3) and args[0].isdigit() and args[1].isdigit()
+    if not valid or (len(args) == 3 and args[2] != "batch"):
+        await message.reply_text(USAGE)
+        return
+
+    first_id, last_id = sorted((int(args[0]), int(args[1])))
+    batch_id = str(uuid.uuid4()) if len(args) == 3 else None
+    chunk_size = max(1, min(config.INDEX_CHUNK_SIZE, MAX_INDEX_CHUNK))
+    chunks = [
+        list(range(start, min(start + chunk_size, last_id + 1)))
+        for start in range(first_id, last_id + 1, chunk_size)
+    ]
+    total = last_id - first_id + 1
+
+    status_msg = await message.reply_text(f"🔄 **Indexing {total} messages...**")
+    reporter = ProgressReporter(status_msg.edit_text, total, config.PROGRESS_INTERVAL)
+    progress = {"scanned": 0, "indexed": 0, "duplicates": 0, "size": 0}
+    batch_files: List[Tuple[int, Dict[str, Any]]] = []  # (scanned message id, batch file)
+    semaphore = asyncio.Semaphore(max(1, config.INDEX_CONCURRENCY))
+
+    async def index_chunk(message_ids: List[int]) -> None:
+        async with semaphore:
+            messages = await call_with_flood_wait(
+                lambda: client.get_messages(config.DB_CHANNEL_ID, message_ids)
+            )
+            records = [
+                record for record in (build_file_record(msg, message.from_user.id, batch_id) for msg in messages)
+                if record
+            ]
+            stored = set(await db.add_files(records))
+            # Media registered before is rejected by the file_unique_id index; batch its existing record
+            existing = await db.get_files_by_unique_ids([
+                record["file_unique_id"] for record in records
+                if record["uuid"] not in stored and record["file_unique_id"]
+            ])
+
+        for record in records:
+            if record["uuid"] in stored:
+                progress["indexed"] += 1
+                progress["size"] += record["file_size"]
+                message_id = record["message_id"]
+            elif record["file_unique_id"] in existing:
+                progress["duplicates"] += 1
+                message_id = existing[record["file_unique_id"]]["message_id"]
+            else:
+                continue
+            if batch_id:
+                batch_files.append((record["message_id"], {
+                    "message_id": message_id,
+                    "file_name": record["file_name"],
+                    "file_size": record["file_size"],
+                    "mime_type": record["mime_type"] or "",
+                    "file_type": record["file_type"],
+                    "upload_time": datetime.utcnow()
+                }))
+        progress["scanned"] += len(message_ids)
+
+        await reporter.update(progress["scanned"], lambda: (
+            f"🔄 **Indexing...**\n\n"
+            f"📨 Scanned: {progress['scanned']}/{total}\n"
+            f"📁 Indexed: {progress['indexed']}\n"
+            f"♻️ Already indexed: {progress['duplicates']}\n"
+            f"💾 Size: {humanbytes(progress['size'])}\n"
+            f"⏳ ETA: {reporter.eta_text()}"
+        ))
+
+    tasks = [asyncio.create_task(index_chunk(chunk)) for chunk in chunks]
+    try:
+        await asyncio.gather(*tasks)
+
+        text = (
+            f"✅ **Indexing Completed**\n\n"
+            f"📨 Scanned: {total} messages\n"
+            f"📁 Indexed: {progress['indexed']} files\n"
+            f"♻️ Already indexed: {progress['duplicates']} files\n"
+            f"⏭ Skipped: {total - progress['indexed'] - progress['duplicates']} (no media or deleted)\n"
+            f"💾 Size: {humanbytes(progress['size'])}\n"
+            f"⏱ Time: {int(reporter.elapsed)} seconds"
+        )
+
+        if batch_id and batch_files:
+            # In channel order, even where a duplicate points at an earlier message
+            files = [file for _, file in sorted(batch_files, key=lambda item: item[0])]
+            await db.create_batch({
+                "batch_id": batch_id,
+                "created_by": message.from_user.id,
+                "total_files": len(files),
+                "files": files,
+                "creation_time": datetime.utcnow(),
+                "downloads": 0,
+                "description": f"DB channel messages {first_id}-{last_id}",
+                "auto_delete": False,
+                "auto_delete_time": config.DEFAULT_DELETE_TIME
+            })
+            text += f"\n\n🔗 **Batch Link:** `https://t.me/{config.BOT_USERNAME}?start=batch_{batch_id}`"
+
+        await reporter.finish(text)
+    except Exception as e:
+        logger.error(f"Indexing failed: {e}")
+        # gather leaves the other chunks running; stop them before reporting
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await reporter.finish(
+            f"❌ **Indexing Failed**\n\n"
+            f"Error: {str(e)}\n"
+            f"📁 Indexed before the error: {progress['indexed']}"
+        )
+
+
+@Client.on_message(filters.command("backfill_ids"))
+async def backfill_ids_command(client: Client, message: Message):
+    """One-off: record file_unique_id for files stored before uploads were deduplicated"""
+    if not is_admin(message):
+        await message.reply_text("⚠️ You are not authorized to run backfills!")
+        return
+
+    status_msg = await message.reply_text("🔄 **Backfilling file ids...**")
+    reporter = ProgressReporter(status_msg.edit_text, interval=config.PROGRESS_INTERVAL)
+    after_uuid = None
+    scanned = updated = 0
+
+    try:
+        while True:
+            page = await db.get_files_missing_unique_id(after_uuid, MAX_INDEX_CHUNK)
+            if not page:
+                break
+            after_uuid = page[-1]["uuid"]
+
+            message_ids = [file["message_id"] for file in page if file.get("message_id")]
+            messages = await call_with_flood_wait(
+                lambda: client.get_messages(config.DB_CHANNEL_ID, message_ids)
+            ) if message_ids else []
+            by_id = {msg.id: msg for msg in messages if not msg.empty}
+
+            unique_ids = {}
+            for file in page:
+                msg = by_id.get(file.get("message_id"))
+                media = get_media_info(msg) if msg else None
+                if media and media["file_unique_id"]:
+                    unique_ids[file["uuid"]] = media["file_unique_id"]
+
+            updated += await db.set_file_unique_ids(unique_ids)
+            scanned += len(page)
+
+            await reporter.update(scanned, lambda: (
+                f"🔄 **Backfilling file ids...**\n\n"
+                f"📨 Scanned: {scanned}\n"
+                f"✅ Updated: {updated}\n"
+                f"⚡ Speed: {reporter.rate:.0f} files/s"
+            ))
+
+        await reporter.finish(
+            f"✅ **Backfill Completed**\n\n"
+            f"📨 Scanned: {scanned} files\n"
+            f"✅ Updated: {updated}\n"
+            f"⏭ Skipped: {scanned - updated} (message deleted or duplicate media)"
+        )
+    except Exception as e:
+        logger.error(f"Backfill failed: {e}")
+        await reporter.finish(f"❌ **Backfill Failed**\n\nError: {str(e)}")
@@ -1,10 +1,11 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
-from utils import is_admin, humanbytes
+from database import get_database
+from utils import is_admin, humanbytes, thumbnail_store
+from utils.button_manager import membership_cache_stats
 import config
 
-db = Database()
+db = get_database()
 
 @Client.on_message(filters.command("stats"))
 async def stats_command(client: Client, message: Message):
@@ -13,13 +14,25 @@ async def stats_command(client: Client, message: Message):
         return
     
     stats = await db.get_stats()
+    pool = db.pool_stats()
+    caches = db.cache_stats()
+    memberships = membership_cache_stats()
+    thumbnails = thumbnail_store.stats()
     stats_text = (
         "📊 **Bot Statistics**\n\n"
         f"📁 Files: {stats['total_files']}\n"
         f"👥 Users: {stats['total_users']}\n"
         f"📥 Downloads: {stats['total_downloads']}\n"
+        f"📦 Batches: {stats['total_batches']} ({stats['batch_downloads']} downloads)\n"
         f"💾 Size: {humanbytes(stats['total_size'])}\n"
-        f"🕒 Auto-Delete Files: {stats.get('active_autodelete_files', 0)}\n\n"
+        f"🕒 Auto-Delete Files: {stats.get('active_autodelete_files', 0)}\n"
+        f"🔌 DB Pool: {pool['in_use']} in use | {pool['waiting']} waiting | {pool['open']} open\n"
+        f"🗂 File Cache: {caches['files']['hit_ratio']:.0%} hits | {caches['files']['evictions']} evicted\n"
+        f"🗂 Batch Cache: {caches['batches']['hit_ratio']:.0%} hits | {caches['batches']['evictions']} evicted\n"
+        f"👤 Force-Sub Cache: {memberships['hit_ratio']:.0%} hits | {memberships['size']} users\n"
+        f"🖼 Thumbnail Cache: {thumbnails['hit_ratio']:.0%} hits | {thumbnails['files']} files "
+        f"({humanbytes(thumbnails['bytes'])}) | {thumbnails['evictions']} evicted\n"
+        f"🚫 Unknown Links Blocked: {db.rejected_lookups + caches['missing']['hits']}\n\n"
         f"⏱ Current Auto-Delete Time: {getattr(config, 'DEFAULT_AUTO_DELETE', 30)} minutes"
     )
     await message.reply_text(stats_text)
\ No newline at end of file
@@ -1,13 +1,24 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
+from database import get_database
 from utils import ButtonManager, is_admin, humanbytes
 import config
 import uuid
 
-db = Database()
+db = get_database()
 button_manager = ButtonManager()
 
+async def reply_already_uploaded(status_msg: Message, existing: dict):
+    share_link = f"https://t.me/{config.BOT_USERNAME}?start={existing['uuid']}"
+    await status_msg.edit_text(
+        f"♻️ **File Already Uploaded**\n\n"
+        f"📁 **File Name:** `{existing['file_name']}`\n"
+        f"📊 **Size:** {humanbytes(existing['file_size'])}\n"
+        f"📎 **Type:** {existing['file_type']}\n"
+        f"🔗 **Share Link:** `{share_link}`",
+        reply_markup=button_manager.file_button(existing["uuid"])
+    )
+
 @Client.on_message(filters.command("upload") & filters.reply)
 async def upload_command(client: Client, message: Message):
     if not is_admin(message):
@@ -22,10 +33,20 @@ async def upload_command(client: Client, message: Message):
     status_msg = await message.reply_text("🔄 **Processing Upload**\n\n⏳ Please wait...")
     
     try:
+        media = getattr(replied_msg, replied_msg.media.value, None) if replied_msg.media else None
+        file_unique_id = getattr(media, "file_unique_id", None)
+        
+        if file_unique_id:
+            existing = await db.get_file_by_unique_id(file_unique_id)
+            if existing:
+                await reply_already_uploaded(status_msg, existing)
+                return
+        
         forwarded_msg = await replied_msg.forward(config.DB_CHANNEL_ID)
         
         file_data = {
             "file_id": None,
+            "file_unique_id": file_unique_id,
             "file_name": "Unknown",
             "file_size": 0,
             "file_type": None,
@@ -97,7 +118,16 @@ async def upload_command(client: Client, message: Message):
             await status_msg.edit_text(f"❌ **File too large!**\nMaximum size: {humanbytes(config.MAX_FILE_SIZE)}")
             return
 
-        file_uuid = await db.add_file(file_data)
+        try:
+            file_uuid = await db.add_file(file_data)
+        except Exception:
+            # A concurrent /upload of the same media won the unique file_unique_id index
+            existing = await db.get_file_by_unique_id(file_unique_id) if file_unique_id else None
+            if not existing:
+                raise
+            await client.delete_messages(config.DB_CHANNEL_ID, forwarded_msg.id)
+            await reply_already_uploaded(status_msg, existing)
+            return
         share_link = f"https://t.me/{config.BOT_USERNAME}?start={file_uuid}"
         
         upload_success_text = (
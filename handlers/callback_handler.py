@@ -1,10 +1,11 @@
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery
-from database import Database
+from database import get_database
 from utils import ButtonManager, is_admin
+from handlers.utils.delivery_scheduler import delivery_scheduler
 import config
 
-db = Database()
+db = get_database()
 button_manager = ButtonManager()
 
 @Client.on_callback_query()
@@ -28,19 +29,21 @@ async def callback_handler(client: Client, callback: CallbackQuery):
             return
             
         file_uuid = callback.data.split("_")[1]
-        file_data = await db.get_file(file_uuid)
+        file_data = await db.resolve_file_download(file_uuid)
         
         if not file_data:
             await callback.answer("File not found!", show_alert=True)
             return
             
         try:
-            await client.copy_message(
-                chat_id=callback.message.chat.id,
-                from_chat_id=config.DB_CHANNEL_ID,
-                message_id=file_data["msg_id"]
+            await delivery_scheduler.run(
+                callback.message.chat.id,
+                lambda: client.copy_message(
+                    chat_id=callback.message.chat.id,
+                    from_chat_id=config.DB_CHANNEL_ID,
+                    message_id=file_data["message_id"]
+                )
             )
-            await db.increment_downloads(file_uuid)
         except Exception as e:
             await callback.answer(f"Error: {str(e)}", show_alert=True)
     
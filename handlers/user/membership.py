@@ -0,0 +1,10 @@
+from pyrogram import Client, filters
+from pyrogram.types import ChatMemberUpdated
+from utils.button_manager import forget_membership
+import config
+
+@Client.on_chat_member_updated(filters.chat(config.FORCE_SUB_CHANNEL))
+async def force_sub_member_updated(client: Client, update: ChatMemberUpdated):
+    member = update.new_chat_member or update.old_chat_member
+    if member and member.user:
+        forget_membership(member.user.id)
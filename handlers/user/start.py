@@ -1,33 +1,26 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
+from database import get_database
 from utils import ButtonManager
+from handlers.utils.batch_delivery import (
+    batch_job_id,
+    new_batch_job,
+    claim_batch_job,
+    release_batch_job,
+    start_batch_job
+)
+from handlers.utils.delivery_scheduler import delivery_scheduler, PRIORITY_BATCH
+from handlers.utils.message_delete import schedule_message_deletion
 import config
-import asyncio
 import logging
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-db = Database()
+db = get_database()
 button_manager = ButtonManager()
 
-try:
-    from utils.message_delete import schedule_message_deletion
-except ImportError:
-    try:
-        from ..utils.message_delete import schedule_message_deletion
-    except ImportError:
-        async def schedule_message_deletion(client, file_id, chat_id, message_ids, delete_time):
-            logger.warning(f"Message deletion module not found. Using fallback for file {file_id}")
-            await asyncio.sleep(delete_time * 60)
-            for msg_id in message_ids:
-                try:
-                    await client.delete_messages(chat_id, msg_id)
-                except Exception as e:
-                    logger.error(f"Failed to delete message: {e}")
-
 @Client.on_message(filters.command("start"))
 async def start_command(client: Client, message: Message):
     logger.info(f"Start command received from user {message.from_user.id} with args: {message.command}")
@@ -52,12 +45,16 @@ async def start_command(client: Client, message: Message):
             except Exception as e:
                 logger.error(f"Force subscription check failed: {e}")
         
+        if delivery_scheduler.full:
+            await message.reply_text("⚠️ The bot is busy right now, please try again in a few minutes!")
+            return
+        
         if command_arg.startswith("batch_"):
             batch_id = command_arg.replace("batch_", "")
             logger.info(f"Processing batch download with ID: {batch_id}")
             
             try:
-                batch_data = await db.batches.find_one({"batch_id": batch_id})
+                batch_data = await db.get_batch_data(batch_id)
                 
                 if not batch_data:
                     await message.reply_text("❌ Batch not found or has been deleted!")
@@ -70,73 +67,38 @@ async def start_command(client: Client, message: Message):
                 
                 logger.info(f"Found {len(batch_data['files'])} files in batch {batch_id}")
                 
-                status_msg = await message.reply_text(
-                    f"🚀 Starting batch transfer...\n"
-                    f"📦 Total files: {len(batch_data['files'])}"
-                )
-                
-                success_count = 0
-                failed_count = 0
-                sent_messages = []
+                job_id = batch_job_id(message.chat.id, batch_id)
+                if not claim_batch_job(job_id):
+                    await message.reply_text("⏳ This batch is already being sent to you, please wait!")
+                    return
                 
-                for file_data in batch_data['files']:
-                    try:
-                        logger.info(f"Processing file with message_id: {file_data.get('message_id')}")
-                        
-                        if not file_data.get('message_id'):
-                            logger.error(f"Missing message_id in file data")
-                            failed_count += 1
-                            continue
-                        
-                        copied_msg = await client.copy_message(
-                            chat_id=message.chat.id,
-                            from_chat_id=config.DB_CHANNEL_ID,
-                            message_id=file_data['message_id']
+                try:
+                    queue_text = ""
+                    position = delivery_scheduler.position(message.chat.id, PRIORITY_BATCH)
+                    if position:
+                        queue_text = f"\n⏳ Queue position: {position + 1}"
+                    
+                    job = await db.get_delivery_job(job_id)
+                    if job:
+                        status_msg = await message.reply_text(
+                            f"♻️ Resuming batch transfer...\n"
+                            f"📦 Already processed: {job['cursor']}/{len(batch_data['files'])}"
+                            f"{queue_text}"
                         )
-                        
-                        if copied_msg:
-                            success_count += 1
-                            sent_messages.append(copied_msg.id)
-                            
-                            if success_count % 2 == 0 or success_count == len(batch_data['files']):
-                                await status_msg.edit_text(
-                                    f"📤 Sending: {success_count}/{len(batch_data['files'])} files\n"
-                                    f"✅ Success: {success_count} | ❌ Failed: {failed_count}"
-                                )
-                        
-                        await asyncio.sleep(0.5)
-                        
-                    except Exception as e:
-                        logger.error(f"Error sending file: {str(e)}")
-                        failed_count += 1
-                        continue
-                
-                await db.batches.update_one(
-                    {"batch_id": batch_id},
-                    {"$inc": {"downloads": 1}}
-                )
-                
-                final_text = (
-                    f"✅ Batch Files Completed\n\n"
-                    f"• Total Files: {len(batch_data['files'])}\n"
-                    f"• Successfully Sent: {success_count}\n"
-                )
-                
-                if failed_count > 0:
-                    final_text += f"• Failed to Send: {failed_count}\n"
-                
-                if success_count > 0:
-                    final_text += f"\n⏳ Auto-Delete: Files will be deleted in {config.DEFAULT_DELETE_TIME} minutes"
-                    asyncio.create_task(schedule_message_deletion(
-                        client,
-                        f"batch_{batch_id}",
-                        message.chat.id,
-                        sent_messages + [status_msg.id],
-                        config.DEFAULT_DELETE_TIME
-                    ))
+                        job["status_message_id"] = status_msg.id
+                    else:
+                        status_msg = await message.reply_text(
+                            f"🚀 Starting batch transfer...\n"
+                            f"📦 Total files: {len(batch_data['files'])}"
+                            f"{queue_text}"
+                        )
+                        job = new_batch_job(message.chat.id, batch_id, status_msg.id)
+                    await db.save_delivery_job(job)
+                except Exception:
+                    release_batch_job(job_id)
+                    raise
                 
-                await status_msg.edit_text(final_text)
-                logger.info(f"Batch {batch_id} completed. Success: {success_count}, Failed: {failed_count}")
+                start_batch_job(client, job, batch_data)
                 
             except Exception as e:
                 error_msg = f"Error processing batch: {str(e)}"
@@ -145,38 +107,45 @@ async def start_command(client: Client, message: Message):
             return
             
         try:
-            file_data = await db.get_file(command_arg)
+            file_data = await db.resolve_file_download(command_arg)
             if not file_data:
                 await message.reply_text("❌ File not found or has been deleted!")
                 return
             
-            msg = await client.copy_message(
-                chat_id=message.chat.id,
-                from_chat_id=config.DB_CHANNEL_ID,
-                message_id=file_data["message_id"]
+            copy, position = delivery_scheduler.submit(
+                message.chat.id,
+                lambda: client.copy_message(
+                    chat_id=message.chat.id,
+                    from_chat_id=config.DB_CHANNEL_ID,
+                    message_id=file_data["message_id"]
+                )
             )
+            if position:
+                await message.reply_text(f"⏳ You are number {position + 1} in the queue, your file is coming soon...")
+            msg = await copy
             
-            await db.increment_downloads(command_arg)
-            await db.update_file_message_id(command_arg, msg.id, message.chat.id)
-            
+            delete_time = None
             if file_data.get("auto_delete"):
                 delete_time = file_data.get("auto_delete_time", config.DEFAULT_DELETE_TIME)
-                if delete_time:
-                    info_msg = await msg.reply_text(
-                        f"⏳ File Auto-Delete Information\n\n"
-                        f"This file will be automatically deleted in {delete_time} minutes\n"
-                        f"• Delete Time: {delete_time} minutes\n"
-                        f"• Time Left: {delete_time} minutes\n\n"
-                        f"💡 Save this file to your saved messages before it's deleted!"
-                    )
-                    
-                    asyncio.create_task(schedule_message_deletion(
-                        client,
-                        command_arg,
-                        message.chat.id,
-                        [msg.id, info_msg.id],
-                        delete_time
-                    ))
+            
+            await db.record_delivery(command_arg, message.chat.id, msg.id, delete_time)
+            
+            if delete_time:
+                info_msg = await msg.reply_text(
+                    f"⏳ File Auto-Delete Information\n\n"
+                    f"This file will be automatically deleted in {delete_time} minutes\n"
+                    f"• Delete Time: {delete_time} minutes\n"
+                    f"• Time Left: {delete_time} minutes\n\n"
+                    f"💡 Save this file to your saved messages before it's deleted!"
+                )
+                
+                await schedule_message_deletion(
+                    client,
+                    command_arg,
+                    message.chat.id,
+                    [msg.id, info_msg.id],
+                    delete_time
+                )
                     
         except Exception as e:
             logger.error(f"Single file download failed: {e}")
@@ -1,5 +1,16 @@
-from .message_delete import schedule_message_deletion
+from .message_delete import schedule_message_deletion, deletion_scheduler
+from .delivery_scheduler import delivery_scheduler
+from .batch_delivery import run_batch_job, resume_batch_jobs
+from .broadcast import run_broadcast, resume_broadcasts
+from .batch_sessions import batch_session_store
 
 __all__ = [
-    'schedule_message_deletion'
+    'schedule_message_deletion',
+    'deletion_scheduler',
+    'delivery_scheduler',
+    'run_batch_job',
+    'resume_batch_jobs',
+    'run_broadcast',
+    'resume_broadcasts',
+    'batch_session_store'
 ]
\ No newline at end of file
@@ -0,0 +1,215 @@
+from pyrogram import Client, raw
+from pyrogram.errors import RPCError
+from database import get_database
+from datetime import datetime
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional, Set
+from .message_delete import schedule_message_deletion
+from .flood_wait import call_with_flood_wait
+from .delivery_scheduler import delivery_scheduler, PRIORITY_BATCH
+from utils.progress import ProgressReporter
+import asyncio
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+db = get_database()
+
+# Telegram accepts at most 100 message ids per forward request
+MAX_CHUNK_SIZE = 100
+
+# Batch jobs currently being sent by this process
+_running_jobs: Set[str] = set()
+
+
+async def copy_messages(
+    client: Client,
+    chat_id: int,
+    from_chat_id: int,
+    message_ids: List[int]
+) -> Dict[int, Optional[int]]:
+    """Copy up to 100 messages in one request; maps each delivered source id to its new id (None if unknown)"""
+    random_ids = [client.rnd_id() for _ in message_ids]
+    updates = await client.invoke(
+        raw.functions.messages.ForwardMessages(
+            to_peer=await client.resolve_peer(chat_id),
+            from_peer=await client.resolve_peer(from_chat_id),
+            id=list(message_ids),
+            random_id=random_ids,
+            drop_author=True  # Arrives as a copy, without the "Forwarded from" header
+        )
+    )
+
+    sources = dict(zip(random_ids, message_ids))
+    delivered = {
+        sources[update.random_id]: update.id
+        for update in getattr(updates, "updates", [])
+        if isinstance(update, raw.types.UpdateMessageID) and update.random_id in sources
+    }
+    if delivered:
+        return delivered
+
+    # No random ids came back (e.g. UpdatesTooLong): the request still succeeded, so never send again
+    new_ids = [
+        update.message.id
+        for update in getattr(updates, "updates", [])
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage))
+    ]
+    if len(new_ids) != len(message_ids):
+        logger.warning(
+            f"Could not match {len(message_ids)} copies in chat {chat_id} to their sources; "
+            f"{len(message_ids) - min(len(new_ids), len(message_ids))} will not be auto-deleted"
+        )
+    # Copies arrive in source order; ids are only used to auto-delete them later
+    return dict(zip_longest(message_ids, new_ids[:len(message_ids)]))
+
+
+async def send_chunk(client: Client, chat_id: int, message_ids: List[int]) -> Dict[int, Optional[int]]:
+    """Deliver one chunk; items are sent one by one only if the multi-id request failed"""
+    try:
+        return await call_with_flood_wait(
+            lambda: copy_messages(client, chat_id, config.DB_CHANNEL_ID, message_ids)
+        )
+    except RPCError as e:
+        logger.error(f"Chunk copy failed, retrying items individually: {e}")
+
+    delivered = {}
+    for message_id in message_ids:
+        try:
+            copied = await call_with_flood_wait(
+                lambda: client.copy_message(
+                    chat_id=chat_id,
+                    from_chat_id=config.DB_CHANNEL_ID,
+                    message_id=message_id
+                )
+            )
+            if copied:
+                delivered[message_id] = copied.id
+        except Exception as e:
+            logger.error(f"Error sending file {message_id}: {e}")
+    return delivered
+
+
+def batch_job_id(chat_id: int, batch_id: str) -> str:
+    return f"{chat_id}:{batch_id}"
+
+
+def new_batch_job(chat_id: int, batch_id: str, status_message_id: int) -> Dict[str, Any]:
+    return {
+        "job_id": batch_job_id(chat_id, batch_id),
+        "chat_id": chat_id,
+        "batch_id": batch_id,
+        "status_message_id": status_message_id,
+        "cursor": 0,  # Index of the next file to send
+        "sent_ids": [],  # Ids of delivered copies in the chat, for auto-delete
+        "failed": 0,
+        "updated_at": datetime.utcnow()
+    }
+
+
+def claim_batch_job(job_id: str) -> bool:
+    """Mark a job as running in this process; False if it already is"""
+    if job_id in _running_jobs:
+        return False
+    _running_jobs.add(job_id)
+    return True
+
+
+def release_batch_job(job_id: str) -> None:
+    _running_jobs.discard(job_id)
+
+
+async def run_batch_job(client: Client, job: Dict[str, Any], batch_data: Dict[str, Any]) -> None:
+    """Send the rest of a batch job, persisting the cursor after every chunk"""
+    chat_id = job["chat_id"]
+    files = batch_data["files"]
+    total = len(files)
+    chunk_size = max(1, min(config.BATCH_CHUNK_SIZE, MAX_CHUNK_SIZE))
+
+    progress = ProgressReporter(
+        lambda text: client.edit_message_text(chat_id, job["status_message_id"], text),
+        total,
+        config.PROGRESS_INTERVAL
+    )
+
+    while job["cursor"] < total:
+        chunk = files[job["cursor"]:job["cursor"] + chunk_size]
+        message_ids = [file["message_id"] for file in chunk if file.get("message_id")]
+        if len(message_ids) < len(chunk):
+            logger.error(f"{len(chunk) - len(message_ids)} batch files are missing a message_id")
+
+        delivered = await delivery_scheduler.run(
+            chat_id,
+            lambda: send_chunk(client, chat_id, message_ids),
+            PRIORITY_BATCH
+        ) if message_ids else {}
+        sent_ids = [new_id for new_id in delivered.values() if new_id is not None]
+
+        job["cursor"] += len(chunk)
+        job["sent_ids"].extend(sent_ids)
+        job["failed"] += len(chunk) - len(delivered)
+        await db.update_delivery_job(job["job_id"], job["cursor"], sent_ids, job["failed"])
+
+        await progress.update(job["cursor"], lambda: (
+            f"📤 Sending: {job['cursor']}/{total} files\n"
+            f"✅ Success: {job['cursor'] - job['failed']} | ❌ Failed: {job['failed']}\n"
+            f"⏳ ETA: {progress.eta_text()}"
+        ))
+
+    await db.increment_batch_downloads(job["batch_id"])
+    await db.delete_delivery_job(job["job_id"])
+
+    success_count = total - job["failed"]
+    final_text = (
+        f"✅ Batch Files Completed\n\n"
+        f"• Total Files: {total}\n"
+        f"• Successfully Sent: {success_count}\n"
+    )
+
+    if job["failed"] > 0:
+        final_text += f"• Failed to Send: {job['failed']}\n"
+
+    if success_count > 0:
+        final_text += f"\n⏳ Auto-Delete: Files will be deleted in {config.DEFAULT_DELETE_TIME} minutes"
+        await schedule_message_deletion(
+            client,
+            f"batch_{job['batch_id']}",
+            chat_id,
+            job["sent_ids"] + [job["status_message_id"]],
+            config.DEFAULT_DELETE_TIME
+        )
+
+    await progress.finish(final_text)
+    logger.info(f"Batch {job['batch_id']} completed. Success: {success_count}, Failed: {job['failed']}")
+
+
+def start_batch_job(client: Client, job: Dict[str, Any], batch_data: Dict[str, Any]) -> asyncio.Task:
+    """Run a claimed job in the background, releasing the claim when it ends"""
+    async def run() -> None:
+        try:
+            await run_batch_job(client, job, batch_data)
+        except Exception as e:
+            logger.error(f"Batch job {job['job_id']} failed: {e}")
+        finally:
+            release_batch_job(job["job_id"])
+
+    return asyncio.create_task(run())
+
+
+async def resume_batch_jobs(client: Client) -> None:
+    """Restart every batch delivery that was interrupted by a restart or crash"""
+    for job in await db.get_pending_delivery_jobs():
+        if not claim_batch_job(job["job_id"]):
+            continue
+        try:
+            batch_data = await db.get_batch_data(job["batch_id"])
+        except Exception as e:
+            logger.error(f"Failed to resume batch job {job['job_id']}: {e}")
+            release_batch_job(job["job_id"])
+            continue
+        if not batch_data or not batch_data.get("files"):
+            await db.delete_delivery_job(job["job_id"])
+            release_batch_job(job["job_id"])
+            continue
+        logger.info(f"Resuming batch job {job['job_id']} at file {job['cursor']}")
+        start_batch_job(client, job, batch_data)
@@ -0,0 +1,184 @@
+from pyrogram import Client
+from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+from database import get_database
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import uuid
+import config
+
+logger = logging.getLogger(__name__)
+db = get_database()
+
+# How often sessions are checked for inactivity
+SWEEP_INTERVAL = 60
+
+BATCH_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("Add Description", callback_data="batch_add_desc"),
+        InlineKeyboardButton("Toggle Auto-Delete", callback_data="batch_toggle_delete")
+    ],
+    [
+        InlineKeyboardButton("✅ Done", callback_data="batch_done"),
+        InlineKeyboardButton("❌ Cancel", callback_data="batch_cancel")
+    ]
+])
+
+
+class BatchSession:
+    def __init__(self, user_id: int, batch_id: Optional[str] = None):
+        self.user_id = user_id
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.files = []
+        self.start_time = datetime.utcnow()
+        self.last_active = self.start_time
+        self.description = ""
+        self.current_message = None
+        self.awaiting_description = False
+        self.auto_delete = False
+        self.auto_delete_time = config.DEFAULT_DELETE_TIME
+        self.pending: List[Message] = []  # Received but not yet recorded
+        self.forwarded: Dict[int, int] = {}  # Source id -> DB channel id, forwarded but not yet recorded
+        self.flush_task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+    def settings(self) -> Dict[str, Any]:
+        settings = {
+            "description": self.description,
+            "auto_delete": self.auto_delete,
+            "auto_delete_time": self.auto_delete_time
+        }
+        if self.current_message:
+            settings["panel_chat_id"] = self.current_message.chat.id
+            settings["panel_message_id"] = self.current_message.id
+        return settings
+
+    def draft(self) -> Dict[str, Any]:
+        return {
+            "batch_id": self.batch_id,
+            "created_by": self.user_id,
+            "total_files": len(self.files),
+            "files": list(self.files),
+            "start_time": self.start_time,
+            "downloads": 0,
+            "status": "draft",
+            **self.settings()
+        }
+
+    @classmethod
+    def from_draft(cls, draft: Dict[str, Any]) -> "BatchSession":
+        session = cls(draft["created_by"], draft["batch_id"])
+        session.files = list(draft.get("files", []))
+        session.start_time = draft.get("start_time") or session.start_time
+        session.last_active = draft.get("updated_at") or session.last_active
+        session.description = draft.get("description", "")
+        session.auto_delete = draft.get("auto_delete", False)
+        session.auto_delete_time = draft.get("auto_delete_time", config.DEFAULT_DELETE_TIME)
+        return session
+
+
+def render_panel(session: BatchSession) -> str:
+    text = (
+        "📦 Batch Upload Mode\n\n"
+        f"• Files Received: {len(session.files)}\n"
+        f"• Auto-Delete: {'✅ Enabled' if session.auto_delete else '❌ Disabled'}\n"
+    )
+
+    if session.auto_delete:
+        text += f"• Delete After: {session.auto_delete_time} minutes\n"
+
+    if session.description:
+        text += f"\nDescription: {session.description}\n"
+
+    text += "\nStatus: Receiving files ✅"
+    return text
+
+
+class BatchSessionStore:
+    """Open /batch sessions, each backed by a draft batch so a restart resumes it"""
+
+    def __init__(self, ttl: int):
+        self.ttl = timedelta(seconds=ttl)
+        self.sessions: Dict[int, BatchSession] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, client: Client) -> None:
+        await self._restore(client)
+        self._task = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def open(self, user_id: int) -> BatchSession:
+        session = self.sessions[user_id] = BatchSession(user_id)
+        await db.create_batch_draft(session.draft())
+        return session
+
+    async def save(self, session: BatchSession) -> None:
+        """Persist a change to the session's description, auto-delete settings or panel"""
+        session.last_active = datetime.utcnow()
+        await db.update_batch_draft(session.batch_id, session.settings())
+
+    async def add_files(self, session: BatchSession, files: List[Dict[str, Any]]) -> None:
+        session.last_active = datetime.utcnow()
+        session.files.extend(files)
+        await db.append_batch_files(session.batch_id, files)
+
+    async def publish(self, session: BatchSession) -> bool:
+        return await db.publish_batch_draft(session.batch_id, {
+            **session.settings(),
+            "creation_time": datetime.utcnow()
+        })
+
+    async def discard(self, user_id: int) -> Optional[BatchSession]:
+        """Close a session; a draft that was not published is deleted with it"""
+        session = self.sessions.pop(user_id, None)
+        if session:
+            if session.flush_task:
+                session.flush_task.cancel()
+            await db.delete_batch_draft(session.batch_id)
+        return session
+
+    async def _restore(self, client: Client) -> None:
+        for draft in await db.get_batch_drafts():
+            session = BatchSession.from_draft(draft)
+            try:
+                panel = None
+                if draft.get("panel_message_id"):
+                    panel = await client.get_messages(draft["panel_chat_id"], draft["panel_message_id"])
+                if panel and not panel.empty:
+                    await panel.edit_text(render_panel(session), reply_markup=BATCH_KEYBOARD)
+                    session.current_message = panel
+                else:
+                    # The old panel is gone; post a new one and remember it
+                    session.current_message = await client.send_message(
+                        session.user_id,
+                        render_panel(session),
+                        reply_markup=BATCH_KEYBOARD
+                    )
+                    await db.update_batch_draft(session.batch_id, session.settings())
+            except Exception as e:
+                logger.error(f"Failed to restore batch panel for {session.batch_id}: {e}")
+            self.sessions[session.user_id] = session
+            logger.info(f"Restored batch session {session.batch_id} with {len(session.files)} files")
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(min(SWEEP_INTERVAL, self.ttl.total_seconds()))
+            expired = datetime.utcnow() - self.ttl
+            for user_id, session in list(self.sessions.items()):
+                if session.last_active >= expired or session.pending or session.lock.locked():
+                    continue
+                try:
+                    await self.discard(user_id)
+                    if session.current_message:
+                        await session.current_message.edit_text("⌛ Batch upload expired after inactivity!")
+                except Exception as e:
+                    logger.error(f"Failed to expire batch session {session.batch_id}: {e}")
+
+
+batch_session_store = BatchSessionStore(config.BATCH_DRAFT_TTL)
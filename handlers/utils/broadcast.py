@@ -0,0 +1,147 @@
+from pyrogram import Client
+from pyrogram.errors import FloodWait, InputUserDeactivated, PeerIdInvalid, RPCError, UserIsBlocked
+from database import get_database
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from uuid import uuid4
+from utils.rate_limiter import RateLimiter
+from utils.progress import ProgressReporter, TimeFormatter
+import asyncio
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+db = get_database()
+
+# Errors that will repeat on every send until the user talks to the bot again
+DEAD_USER_ERRORS = (
+    (UserIsBlocked, "blocked"),
+    (InputUserDeactivated, "deactivated"),
+    (PeerIdInvalid, "peer_invalid")
+)
+DEAD_REASONS = [reason for _, reason in DEAD_USER_ERRORS]
+
+
+def new_broadcast(
+    from_chat_id: int,
+    message_id: int,
+    status_message_id: int,
+    total: int,
+    active_since: Optional[datetime] = None
+) -> Dict[str, Any]:
+    return {
+        "broadcast_id": uuid4().hex[:12],
+        "from_chat_id": from_chat_id,
+        "message_id": message_id,
+        "status_chat_id": from_chat_id,
+        "status_message_id": status_message_id,
+        "active_since": active_since,  # Segment: only users active since then
+        "last_user_id": None,  # Every user up to and including this id has been handled
+        "total": total,
+        "success": 0,
+        "failed": 0,
+        **{reason: 0 for reason in DEAD_REASONS},
+        "status": "running",
+        "started_at": datetime.utcnow()
+    }
+
+
+async def _send(client: Client, broadcast: Dict[str, Any], user_id: int, limiter: RateLimiter) -> str:
+    """Returns "ok", one of DEAD_REASONS, or "failed" for errors that may not repeat"""
+    while True:
+        await limiter.acquire()
+        try:
+            await client.copy_message(
+                chat_id=user_id,
+                from_chat_id=broadcast["from_chat_id"],
+                message_id=broadcast["message_id"]
+            )
+            return "ok"
+        except FloodWait as e:
+            logger.warning(f"FloodWait during broadcast, pausing all workers for {e.value}s")
+            limiter.pause(e.value)
+        except RPCError as e:
+            for error, reason in DEAD_USER_ERRORS:
+                if isinstance(e, error):
+                    return reason
+            logger.debug(f"Broadcast to {user_id} failed: {e}")
+            return "failed"
+        except Exception as e:
+            logger.error(f"Broadcast to {user_id} failed: {e}")
+            return "failed"
+
+
+async def run_broadcast(client: Client, broadcast: Dict[str, Any]) -> None:
+    """Send a broadcast page by page, checkpointing after every page"""
+    limiter = RateLimiter(config.BROADCAST_RATE)
+    progress = ProgressReporter(
+        lambda text: client.edit_message_text(broadcast["status_chat_id"], broadcast["status_message_id"], text),
+        broadcast["total"],
+        config.BROADCAST_STATUS_INTERVAL
+    )
+
+    def render() -> str:
+        return (
+            "🔄 **Broadcasting message...**\n\n"
+            f"📤 Sent: {progress.done}/{broadcast['total']}\n"
+            f"✓ Success: {broadcast['success']} | × Failed: {broadcast['failed']}\n"
+            f"⚡ Speed: {progress.rate:.1f} msg/s\n"
+            f"⏳ ETA: {progress.eta_text()}"
+        )
+
+    async def worker(user_ids: Iterator[int], dead: Dict[int, str]) -> None:
+        for user_id in user_ids:  # Shared iterator: each id is taken by exactly one worker
+            outcome = await _send(client, broadcast, user_id, limiter)
+            if outcome == "ok":
+                broadcast["success"] += 1
+            else:
+                broadcast["failed"] += 1
+                if outcome in DEAD_REASONS:
+                    broadcast[outcome] += 1
+                    dead[user_id] = outcome
+            await progress.update(broadcast["success"] + broadcast["failed"], render)
+
+    while True:
+        user_ids = await db.get_user_ids(
+            broadcast["last_user_id"],
+            config.BROADCAST_PAGE_SIZE,
+            broadcast.get("active_since")
+        )
+        if not user_ids:
+            break
+
+        page = iter(user_ids)
+        dead: Dict[int, str] = {}
+        await asyncio.gather(*(worker(page, dead) for _ in range(min(config.BROADCAST_WORKERS, len(user_ids)))))
+        await db.mark_users_dead(dead)
+        broadcast["last_user_id"] = user_ids[-1]
+        await db.save_broadcast(broadcast)
+
+    broadcast["status"] = "done"
+    await db.save_broadcast(broadcast)
+    await progress.finish(
+        "✅ **Broadcast Completed**\n\n"
+        f"✓ Success: {broadcast['success']}\n"
+        f"× Failed: {broadcast['failed']}\n"
+        f"   🚫 Blocked: {broadcast.get('blocked', 0)} | 💀 Deleted: {broadcast.get('deactivated', 0)} | "
+        f"❓ Invalid: {broadcast.get('peer_invalid', 0)}\n"
+        f"📊 Total: {broadcast['success'] + broadcast['failed']}\n"
+        f"⏱ Time: {TimeFormatter(int(progress.elapsed)) or '0s'}"
+    )
+
+
+def start_broadcast(client: Client, broadcast: Dict[str, Any]) -> asyncio.Task:
+    async def run() -> None:
+        try:
+            await run_broadcast(client, broadcast)
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast['broadcast_id']} stopped: {e}")
+
+    return asyncio.create_task(run())
+
+
+async def resume_broadcasts(client: Client) -> None:
+    """Continue broadcasts that were interrupted by a restart, from their last checkpoint"""
+    for broadcast in await db.get_unfinished_broadcasts():
+        logger.info(f"Resuming broadcast {broadcast['broadcast_id']} after user {broadcast['last_user_id']}")
+        start_broadcast(client, broadcast)
@@ -0,0 +1,122 @@
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import config
+
+# Lower values are served first
+PRIORITY_SINGLE = 0
+PRIORITY_BATCH = 1
+
+Job = Tuple[Callable[[], Awaitable[Any]], asyncio.Future]
+
+
+class DeliveryScheduler:
+    """Bounded worker pool serving users round-robin, single files ahead of batch chunks"""
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        # One round-robin ring per priority: user_id -> that user's pending jobs
+        self._queues: List["OrderedDict[int, Deque[Job]]"] = [OrderedDict(), OrderedDict()]
+        self._queued = 0
+        self._ready = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.completed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queued
+
+    @property
+    def full(self) -> bool:
+        """New requests should be refused; jobs of running deliveries are still accepted"""
+        return self._queued >= self.max_queued
+
+    def position(self, user_id: int, priority: int = PRIORITY_SINGLE) -> int:
+        """How many queued jobs will be served before the next one this user submits"""
+        ahead = sum(len(jobs) for level in self._queues[:priority] for jobs in level.values())
+        ring = self._queues[priority]
+        own = len(ring.get(user_id, ()))
+        ahead += sum(min(len(jobs), own + 1) for other, jobs in ring.items() if other != user_id)
+        return ahead + own
+
+    def submit(
+        self,
+        user_id: int,
+        func: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_SINGLE
+    ) -> Tuple[asyncio.Future, int]:
+        """Queue func(); returns a future for its result and the number of jobs ahead of it"""
+        self._ensure_workers()
+        position = self.position(user_id, priority)
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append((func, future))
+        self._queued += 1
+        self._ready.set()
+        return future, position
+
+    async def run(self, user_id: int, func: Callable[[], Awaitable[Any]], priority: int = PRIORITY_SINGLE) -> Any:
+        future, _ = self.submit(user_id, func, priority)
+        return await future
+
+    def _ensure_workers(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _next_job(self) -> Optional[Job]:
+        for ring in self._queues:
+            if ring:
+                user_id, jobs = next(iter(ring.items()))
+                job = jobs.popleft()
+                if jobs:
+                    ring.move_to_end(user_id)  # Other users get a turn before this one's next job
+                else:
+                    del ring[user_id]
+                self._queued -= 1
+                return job
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            func, future = job
+            if future.done():  # The requester gave up waiting
+                continue
+
+            self.running += 1
+            try:
+                result = await func()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                if not future.done():  # Worker cancelled mid-job
+                    future.cancel()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for ring in self._queues:
+            for jobs in ring.values():
+                for _, future in jobs:
+                    future.cancel()
+            ring.clear()
+        self._queued = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "running": self.running, "pending": self._queued, "completed": self.completed}
+
+
+delivery_scheduler = DeliveryScheduler(config.DELIVERY_WORKERS, config.DELIVERY_QUEUE_LIMIT)
@@ -0,0 +1,16 @@
+from pyrogram.errors import FloodWait
+from typing import Any, Awaitable, Callable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def call_with_flood_wait(func: Callable[[], Awaitable[Any]]) -> Any:
+    """Run an API call, sleeping exactly as long as Telegram asks on FloodWait"""
+    while True:
+        try:
+            return await func()
+        except FloodWait as e:
+            logger.warning(f"FloodWait, sleeping {e.value}s")
+            await asyncio.sleep(e.value)
@@ -1,24 +1,148 @@
 from pyrogram import Client
-from database import Database
+from database import get_database
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+from .flood_wait import call_with_flood_wait
 import asyncio
+import heapq
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+db = get_database()
+
+# Telegram accepts at most 100 message ids per delete request
+MAX_DELETE_IDS = 100
+
+DELETE_NOTICE = (
+    "🚫 **File Deleted Due to Copyright Protection**\n\n"
+    "The file you received has been automatically deleted as part of our copyright protection measures.\n\n"
+    "• If you need the file again, you can request it using the same link\n"
+    "• Save important files to your saved messages before they're deleted\n"
+    "• This helps us maintain a fair and legal file-sharing environment"
+)
+
+
+class DeletionScheduler:
+    """Auto-delete queue persisted in the database; only the next window of deletions is held in memory"""
+
+    def __init__(self, window: int, batch_size: int, coalesce: int):
+        self.window = timedelta(seconds=window)
+        self.coalesce = timedelta(seconds=coalesce)
+        self.batch_size = max(1, batch_size)
+        self.client: Optional[Client] = None
+        self._heap: List[Tuple[datetime, str, Dict[str, Any]]] = []
+        self._queued: Set[str] = set()  # Ids currently in the heap
+        self._horizon: Optional[datetime] = None  # Every deletion due before this is in the heap
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, client: Client) -> None:
+        self.client = client
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def schedule(self, file_uuid: str, chat_id: int, message_ids: List[int], delete_time: int) -> None:
+        deletion = {
+            "_id": uuid4().hex,
+            "file_uuid": file_uuid,
+            "chat_id": chat_id,
+            "message_ids": list(message_ids),
+            "due_at": datetime.utcnow() + timedelta(minutes=delete_time)
+        }
+        await db.add_scheduled_deletion(deletion)
+        if self._horizon is not None and deletion["due_at"] < self._horizon:
+            self._push(deletion)
+            self._wakeup.set()
+
+    def _push(self, deletion: Dict[str, Any]) -> None:
+        if deletion["_id"] not in self._queued:
+            self._queued.add(deletion["_id"])
+            heapq.heappush(self._heap, (deletion["due_at"], deletion["_id"], deletion))
+
+    async def _load(self, now: datetime) -> None:
+        """Pull every stored deletion due before the next horizon into the heap"""
+        horizon = now + self.window
+        deletions = await db.get_due_deletions(horizon, self.batch_size)
+        if len(deletions) == self.batch_size:
+            horizon = deletions[-1]["due_at"]  # Backlog; the rest is read once these are done
+        for deletion in deletions:
+            self._push(deletion)
+        self._horizon = horizon
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = datetime.utcnow()
+                if self._horizon is None or now >= self._horizon:
+                    await self._load(now)
+
+                # Anything due within the coalesce window goes out now, sharing calls per chat
+                due = []
+                cutoff = now + self.coalesce
+                while self._heap and self._heap[0][0] <= cutoff and len(due) < self.batch_size:
+                    due.append(heapq.heappop(self._heap)[2])
+                if due:
+                    await self._process(due)
+                    continue
+
+                next_at = min(self._heap[0][0] - self.coalesce, self._horizon) if self._heap else self._horizon
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, (next_at - now).total_seconds()))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Auto-delete scheduler error: {e}")
+                await asyncio.sleep(5)
+
+    async def _process(self, due: List[Dict[str, Any]]) -> None:
+        by_chat: Dict[int, List[int]] = defaultdict(list)
+        for deletion in due:
+            by_chat[deletion["chat_id"]].extend(deletion["message_ids"])
+
+        try:
+            for chat_id, message_ids in by_chat.items():
+                await self._delete_chat(chat_id, message_ids)
+
+            await db.remove_file_messages([
+                (chat_id, message_id)
+                for chat_id, message_ids in by_chat.items()
+                for message_id in message_ids
+            ])
+            await db.remove_scheduled_deletions([deletion["_id"] for deletion in due])
+        finally:
+            # Deletions left in the DB after a failure are picked up again by the next refill
+            for deletion in due:
+                self._queued.discard(deletion["_id"])
+
+    async def _delete_chat(self, chat_id: int, message_ids: List[int]) -> None:
+        """Delete one chat's due messages in as few requests as possible, then notify once"""
+        try:
+            for start in range(0, len(message_ids), MAX_DELETE_IDS):
+                chunk = message_ids[start:start + MAX_DELETE_IDS]
+                await call_with_flood_wait(lambda: self.client.delete_messages(chat_id, chunk))
+            await call_with_flood_wait(lambda: self.client.send_message(chat_id=chat_id, text=DELETE_NOTICE))
+        except Exception as e:
+            logger.error(f"Error in auto-delete: {str(e)}")
+
+
+deletion_scheduler = DeletionScheduler(
+    config.DELETE_QUEUE_WINDOW,
+    config.DELETE_QUEUE_BATCH,
+    config.DELETE_COALESCE_WINDOW
+)
 
-db = Database()
 
 async def schedule_message_deletion(client: Client, file_uuid: str, chat_id: int, message_ids: list, delete_time: int):
-    await asyncio.sleep(delete_time * 60)
-    try:
-        await client.delete_messages(chat_id, message_ids)
-        await client.send_message(
-            chat_id=chat_id,
-            text=(
-                "🚫 **File Deleted Due to Copyright Protection**\n\n"
-                "The file you received has been automatically deleted as part of our copyright protection measures.\n\n"
-                "• If you need the file again, you can request it using the same link\n"
-                "• Save important files to your saved messages before they're deleted\n"
-                "• This helps us maintain a fair and legal file-sharing environment"
-            )
-        )
-        for msg_id in message_ids:
-            await db.remove_file_message(file_uuid, chat_id, msg_id)
-    except Exception as e:
-        print(f"Error in auto-delete: {str(e)}")
\ No newline at end of file
+    """Queue messages for deletion after delete_time minutes; the queue survives restarts"""
+    await deletion_scheduler.schedule(file_uuid, chat_id, message_ids, delete_time)
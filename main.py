@@ -2,7 +2,14 @@
 from pyrogram import Client, idle
 from flask import Flask, jsonify
 from keepalive import ping_server
-from database import Database
+from database import get_database
+from handlers.utils import (
+    resume_batch_jobs,
+    resume_broadcasts,
+    delivery_scheduler,
+    deletion_scheduler,
+    batch_session_store
+)
 import config
 import asyncio
 import os
@@ -23,23 +30,38 @@ class FileShareBot(Client):
             api_id=config.API_ID,
             api_hash=config.API_HASH,
             bot_token=config.BOT_TOKEN,
-            plugins=dict(root="handlers")
+            plugins=dict(root="handlers"),
+            workers=config.WORKERS,
+            max_concurrent_transmissions=config.MAX_CONCURRENT_TRANSMISSIONS
         )
-        self.db = Database()
+        self.db = get_database()
         print("Bot Initialized!")
 
     async def start(self):
         await super().start()
+        await self.db.start()
+        await deletion_scheduler.start(self)
+
         me = await self.get_me()
         print(f"Bot Started as {me.first_name}")
         print(f"Username: @{me.username}")
         print("----------------")
 
+        await resume_batch_jobs(self)
+        await resume_broadcasts(self)
+        await batch_session_store.start(self)
+
         if config.PING_MODE:
-            await ping_server(config.PING_URL, config.PING_TIME)
+            asyncio.create_task(ping_server(config.PING_URL, config.PING_TIME))
 
     async def stop(self):
-        await super().stop()
+        try:
+            await delivery_scheduler.stop()
+            await deletion_scheduler.stop()
+            await batch_session_store.stop()
+            await super().stop()
+        finally:
+            await self.db.stop()
         print("Bot Stopped. Bye!")
 
 async def main():
@@ -0,0 +1,9 @@
+from .base import Storage, STATS_FIELDS, new_file_document, new_batch_document, delivery_delete_at
+
+__all__ = [
+    'Storage',
+    'STATS_FIELDS',
+    'new_file_document',
+    'new_batch_document',
+    'delivery_delete_at'
+]
@@ -0,0 +1,261 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+import config
+
+STATS_FIELDS = [
+    "total_files",
+    "total_users",
+    "total_size",
+    "total_downloads",
+    "total_batches",
+    "batch_downloads",
+    "active_autodelete_files"
+]
+
+EMPTY_CACHE_STATS = {"size": 0, "hits": 0, "misses": 0, "evictions": 0, "hit_ratio": 0.0}
+
+
+def new_file_document(file_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "file_id": file_data["file_id"],
+        "file_unique_id": file_data.get("file_unique_id"),  # Same media, same id, across uploads
+        "file_name": file_data["file_name"],
+        "file_size": file_data["file_size"],
+        "file_type": file_data["file_type"],
+        "uuid": file_data["uuid"],
+        "uploader_id": file_data["uploader_id"],
+        "message_id": file_data["message_id"],
+        "downloads": 0,
+        "auto_delete": file_data.get("auto_delete", False),
+        "auto_delete_time": file_data.get("auto_delete_time", None),
+        "uploaded_at": datetime.utcnow(),
+        "batch_id": file_data.get("batch_id", None)  # For batch association
+    }
+
+
+def new_batch_document(batch_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "batch_id": batch_data["batch_id"],
+        "created_by": batch_data["created_by"],
+        "total_files": batch_data["total_files"],
+        "created_at": datetime.utcnow(),
+        "downloads": 0,
+        "description": batch_data.get("description", ""),
+        "status": "active",
+        "files": batch_data.get("files", []),  # Store file references
+        "last_download": None
+    }
+
+
+def delivery_delete_at(sent_at: datetime, delete_after: Optional[int]) -> datetime:
+    """When a delivery record stops counting as a live copy of its file"""
+    if delete_after:
+        return sent_at + timedelta(minutes=delete_after)
+    return sent_at + timedelta(days=config.DELIVERY_RETENTION_DAYS)
+
+
+class Storage(ABC):
+    """The data access surface the handlers rely on, implemented per backend"""
+
+    rejected_lookups = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def flush_writes(self) -> None:
+        pass
+
+    def pool_stats(self) -> Dict[str, int]:
+        return {"open": 0, "in_use": 0, "waiting": 0}
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(EMPTY_CACHE_STATS) for name in ("files", "batches", "missing")}
+
+    # Files
+
+    @abstractmethod
+    async def add_file(self, file_data: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    async def add_files(self, files: List[Dict[str, Any]]) -> List[str]:
+        """Insert many files in one unordered write; returns the uuids that were stored"""
+
+    @abstractmethod
+    async def get_file_by_unique_id(self, file_unique_id: str) -> Optional[Dict[str, Any]]: ...
+
+    async def get_files_by_unique_ids(self, file_unique_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored files for any of the given file_unique_ids, keyed by file_unique_id"""
+        files = {}
+        for file_unique_id in set(file_unique_ids):
+            file = await self.get_file_by_unique_id(file_unique_id)
+            if file:
+                files[file_unique_id] = file
+        return files
+
+    @abstractmethod
+    async def get_files_missing_unique_id(self, after_uuid: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Next page (by uuid) of files stored before file_unique_id was recorded"""
+
+    @abstractmethod
+    async def set_file_unique_ids(self, unique_ids: Dict[str, str]) -> int:
+        """Backfill uuid -> file_unique_id; ids already taken by another file are skipped"""
+
+    @abstractmethod
+    async def get_file(self, uuid: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def increment_downloads(self, uuid: str) -> None: ...
+
+    async def resolve_file_download(self, uuid: str) -> Optional[Dict[str, Any]]:
+        """Fetch the file record needed for delivery and count the download"""
+        file = await self.get_file(uuid)
+        if file:
+            await self.increment_downloads(uuid)
+        return file
+
+    @abstractmethod
+    async def set_file_autodelete(self, uuid: str, delete_time: int) -> bool: ...
+
+    @abstractmethod
+    async def get_autodelete_files(self) -> List[Dict[str, Any]]: ...
+
+    # Deliveries
+
+    @abstractmethod
+    async def record_delivery(
+        self,
+        uuid: str,
+        chat_id: int,
+        message_id: int,
+        delete_after: Optional[int] = None
+    ) -> None: ...
+
+    @abstractmethod
+    async def get_live_deliveries(self, uuid: str) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None: ...
+
+    async def remove_file_messages(self, messages: List[Tuple[int, int]]) -> None:
+        """Drop the delivery records of many (chat_id, message_id) pairs"""
+        for chat_id, message_id in messages:
+            await self.remove_file_message(None, chat_id, message_id)
+
+    # Scheduled message deletions
+
+    @abstractmethod
+    async def add_scheduled_deletion(self, deletion: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def get_due_deletions(self, due_before: datetime, limit: int) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def remove_scheduled_deletions(self, deletion_ids: List[str]) -> None: ...
+
+    # Batch delivery jobs
+
+    @abstractmethod
+    async def save_delivery_job(self, job: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def get_delivery_job(self, job_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def update_delivery_job(self, job_id: str, cursor: int, sent_ids: List[int], failed: int) -> None: ...
+
+    @abstractmethod
+    async def delete_delivery_job(self, job_id: str) -> None: ...
+
+    @abstractmethod
+    async def get_pending_delivery_jobs(self) -> List[Dict[str, Any]]: ...
+
+    # Batches
+
+    @abstractmethod
+    async def add_batch(self, batch_data: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    async def create_batch(self, batch_doc: Dict[str, Any]) -> str: ...
+
+    @abstractmethod
+    async def get_batch_data(self, batch_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_batch_files(self, batch_id: str) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def increment_batch_downloads(self, batch_id: str) -> None: ...
+
+    @abstractmethod
+    async def get_user_batches(self, user_id: int) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def update_batch_status(self, batch_id: str, status: str) -> None: ...
+
+    # Batch drafts: batches still being built, hidden from lookups until published
+
+    @abstractmethod
+    async def create_batch_draft(self, draft: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def update_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def append_batch_files(self, batch_id: str, files: List[Dict[str, Any]]) -> None: ...
+
+    @abstractmethod
+    async def publish_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> bool: ...
+
+    @abstractmethod
+    async def delete_batch_draft(self, batch_id: str) -> None: ...
+
+    @abstractmethod
+    async def get_batch_drafts(self) -> List[Dict[str, Any]]: ...
+
+    # Users
+
+    @abstractmethod
+    async def add_user(self, user_id: int, username: str = None) -> None: ...
+
+    @abstractmethod
+    async def update_user_activity(self, user_id: int) -> None: ...
+
+    @abstractmethod
+    async def get_all_users(self) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_user_ids(
+        self,
+        after_user_id: Optional[int],
+        limit: int,
+        active_since: Optional[datetime] = None
+    ) -> List[int]:
+        """The next page of live user ids, ascending, strictly after after_user_id"""
+
+    @abstractmethod
+    async def count_users(self, active_since: Optional[datetime] = None) -> int:
+        """Live users, optionally only those active since a given time"""
+
+    @abstractmethod
+    async def mark_users_dead(self, reasons: Dict[int, str]) -> None:
+        """Flag users that can no longer be messaged (user_id -> reason); add_user revives them"""
+
+    # Broadcasts
+
+    @abstractmethod
+    async def save_broadcast(self, broadcast: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]: ...
+
+    # Statistics
+
+    @abstractmethod
+    async def get_stats(self) -> Dict[str, Any]: ...
@@ -0,0 +1,277 @@
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+import config
+from .base import Storage, STATS_FIELDS, new_file_document, new_batch_document, delivery_delete_at
+
+
+class MemoryStorage(Storage):
+    """Process-local backend for reproducible benchmarks and tests; nothing is persisted"""
+
+    def __init__(self):
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.unique_ids: Dict[str, str] = {}  # file_unique_id -> uuid
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.deliveries: List[Dict[str, Any]] = []
+        self.delivery_jobs: Dict[str, Dict[str, Any]] = {}
+        self.scheduled_deletions: Dict[str, Dict[str, Any]] = {}
+        self.broadcasts: Dict[str, Dict[str, Any]] = {}
+        print("In-Memory Storage Ready!")
+
+    async def add_file(self, file_data: Dict[str, Any]) -> str:
+        file_doc = new_file_document(file_data)
+        if file_doc["uuid"] in self.files:
+            raise ValueError(f"Duplicate file uuid: {file_doc['uuid']}")
+        if file_doc["file_unique_id"] and file_doc["file_unique_id"] in self.unique_ids:
+            raise ValueError(f"Duplicate file_unique_id: {file_doc['file_unique_id']}")
+        self.files[file_doc["uuid"]] = file_doc
+        if file_doc["file_unique_id"]:
+            self.unique_ids[file_doc["file_unique_id"]] = file_doc["uuid"]
+        return file_doc["uuid"]
+
+    async def add_files(self, files: List[Dict[str, Any]]) -> List[str]:
+        stored = []
+        for file_data in files:
+            try:
+                stored.append(await self.add_file(file_data))
+            except ValueError:
+                continue
+        return stored
+
+    async def get_file(self, uuid: str) -> Optional[Dict[str, Any]]:
+        file = self.files.get(uuid)
+        return dict(file) if file else None
+
+    async def get_file_by_unique_id(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        uuid = self.unique_ids.get(file_unique_id)
+        return await self.get_file(uuid) if uuid else None
+
+    async def get_files_missing_unique_id(self, after_uuid: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        missing = sorted(
+            uuid for uuid, file in self.files.items()
+            if not file.get("file_unique_id") and (after_uuid is None or uuid > after_uuid)
+        )
+        return [{"uuid": uuid, "message_id": self.files[uuid]["message_id"]} for uuid in missing[:limit]]
+
+    async def set_file_unique_ids(self, unique_ids: Dict[str, str]) -> int:
+        updated = 0
+        for uuid, file_unique_id in unique_ids.items():
+            if uuid in self.files and file_unique_id not in self.unique_ids:
+                self.files[uuid]["file_unique_id"] = file_unique_id
+                self.unique_ids[file_unique_id] = uuid
+                updated += 1
+        return updated
+
+    async def increment_downloads(self, uuid: str) -> None:
+        file = self.files.get(uuid)
+        if file:
+            file["downloads"] += 1
+            file["last_download"] = datetime.utcnow()
+
+    async def set_file_autodelete(self, uuid: str, delete_time: int) -> bool:
+        file = self.files.get(uuid)
+        if not file:
+            return False
+        file.update({"auto_delete": True, "auto_delete_time": delete_time, "delete_at": datetime.utcnow()})
+        return True
+
+    async def get_autodelete_files(self) -> List[Dict[str, Any]]:
+        return [dict(file) for file in self.files.values() if file.get("auto_delete")]
+
+    def _purge_deliveries(self) -> None:
+        now = datetime.utcnow()
+        self.deliveries = [delivery for delivery in self.deliveries if delivery["delete_at"] > now]
+
+    async def record_delivery(
+        self,
+        uuid: str,
+        chat_id: int,
+        message_id: int,
+        delete_after: Optional[int] = None
+    ) -> None:
+        self._purge_deliveries()
+        sent_at = datetime.utcnow()
+        self.deliveries.append({
+            "uuid": uuid,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "sent_at": sent_at,
+            "delete_at": delivery_delete_at(sent_at, delete_after)
+        })
+
+    async def get_live_deliveries(self, uuid: str) -> List[Dict[str, Any]]:
+        self._purge_deliveries()
+        return [dict(delivery) for delivery in self.deliveries if delivery["uuid"] == uuid]
+
+    async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None:
+        self.deliveries = [
+            delivery for delivery in self.deliveries
+            if (delivery["chat_id"], delivery["message_id"]) != (chat_id, message_id)
+        ]
+
+    async def add_scheduled_deletion(self, deletion: Dict[str, Any]) -> None:
+        self.scheduled_deletions[deletion["_id"]] = dict(deletion)
+
+    async def get_due_deletions(self, due_before: datetime, limit: int) -> List[Dict[str, Any]]:
+        due = sorted(
+            (deletion for deletion in self.scheduled_deletions.values() if deletion["due_at"] <= due_before),
+            key=lambda deletion: deletion["due_at"]
+        )
+        return [dict(deletion) for deletion in due[:limit]]
+
+    async def remove_scheduled_deletions(self, deletion_ids: List[str]) -> None:
+        for deletion_id in deletion_ids:
+            self.scheduled_deletions.pop(deletion_id, None)
+
+    async def save_delivery_job(self, job: Dict[str, Any]) -> None:
+        self.delivery_jobs[job["job_id"]] = {**job, "sent_ids": list(job["sent_ids"]), "updated_at": datetime.utcnow()}
+
+    async def get_delivery_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.delivery_jobs.get(job_id)
+        return {**job, "sent_ids": list(job["sent_ids"])} if job else None
+
+    async def update_delivery_job(self, job_id: str, cursor: int, sent_ids: List[int], failed: int) -> None:
+        job = self.delivery_jobs.get(job_id)
+        if job:
+            job["sent_ids"].extend(sent_ids)
+            job.update({"cursor": cursor, "failed": failed, "updated_at": datetime.utcnow()})
+
+    async def delete_delivery_job(self, job_id: str) -> None:
+        self.delivery_jobs.pop(job_id, None)
+
+    async def get_pending_delivery_jobs(self) -> List[Dict[str, Any]]:
+        return [{**job, "sent_ids": list(job["sent_ids"])} for job in self.delivery_jobs.values()]
+
+    async def add_batch(self, batch_data: Dict[str, Any]) -> str:
+        return await self.create_batch(new_batch_document(batch_data))
+
+    async def create_batch(self, batch_doc: Dict[str, Any]) -> str:
+        if batch_doc["batch_id"] in self.batches:
+            raise ValueError(f"Duplicate batch id: {batch_doc['batch_id']}")
+        self.batches[batch_doc["batch_id"]] = dict(batch_doc)
+        return batch_doc["batch_id"]
+
+    async def get_batch_data(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = self.batches.get(batch_id)
+        return dict(batch) if batch and batch.get("status") != "draft" else None
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await self.get_batch_data(batch_id)
+        if batch:
+            batch["files"] = await self.get_batch_files(batch_id)
+        return batch
+
+    async def get_batch_files(self, batch_id: str) -> List[Dict[str, Any]]:
+        return [dict(file) for file in self.files.values() if file.get("batch_id") == batch_id]
+
+    async def increment_batch_downloads(self, batch_id: str) -> None:
+        batch = self.batches.get(batch_id)
+        if batch:
+            batch["downloads"] = batch.get("downloads", 0) + 1
+            batch["last_download"] = datetime.utcnow()
+
+    async def get_user_batches(self, user_id: int) -> List[Dict[str, Any]]:
+        return [
+            dict(batch) for batch in self.batches.values()
+            if batch.get("created_by") == user_id and batch.get("status") != "draft"
+        ]
+
+    async def update_batch_status(self, batch_id: str, status: str) -> None:
+        if batch_id in self.batches:
+            self.batches[batch_id]["status"] = status
+
+    def _draft(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = self.batches.get(batch_id)
+        return batch if batch and batch.get("status") == "draft" else None
+
+    async def create_batch_draft(self, draft: Dict[str, Any]) -> None:
+        await self.create_batch({**draft, "files": list(draft.get("files", [])), "updated_at": datetime.utcnow()})
+
+    async def update_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> None:
+        draft = self._draft(batch_id)
+        if draft:
+            draft.update(fields, updated_at=datetime.utcnow())
+
+    async def append_batch_files(self, batch_id: str, files: List[Dict[str, Any]]) -> None:
+        draft = self._draft(batch_id)
+        if draft:
+            draft["files"].extend(dict(file) for file in files)
+            draft.update(total_files=len(draft["files"]), updated_at=datetime.utcnow())
+
+    async def publish_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> bool:
+        draft = self._draft(batch_id)
+        if not draft:
+            return False
+        draft.update(fields, status="active")
+        draft.pop("updated_at", None)
+        return True
+
+    async def delete_batch_draft(self, batch_id: str) -> None:
+        if self._draft(batch_id):
+            del self.batches[batch_id]
+
+    async def get_batch_drafts(self) -> List[Dict[str, Any]]:
+        expired = datetime.utcnow() - timedelta(seconds=config.BATCH_DRAFT_TTL)
+        drafts = [batch for batch in self.batches.values() if batch.get("status") == "draft"]
+        for draft in drafts:
+            if draft["updated_at"] < expired:
+                del self.batches[draft["batch_id"]]
+        return [{**draft, "files": list(draft["files"])} for draft in drafts if draft["updated_at"] >= expired]
+
+    async def add_user(self, user_id: int, username: str = None) -> None:
+        user = self.users.setdefault(user_id, {"user_id": user_id, "joined_date": datetime.utcnow()})
+        user.update({"username": username, "last_active": datetime.utcnow(), "dead_reason": None})
+
+    async def update_user_activity(self, user_id: int) -> None:
+        if user_id in self.users:
+            self.users[user_id]["last_active"] = datetime.utcnow()
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        return [dict(user) for user in self.users.values()]
+
+    def _in_audience(self, user: Dict[str, Any], active_since: Optional[datetime]) -> bool:
+        if user.get("dead_reason"):
+            return False
+        return active_since is None or (user.get("last_active") is not None and user["last_active"] >= active_since)
+
+    async def get_user_ids(
+        self,
+        after_user_id: Optional[int],
+        limit: int,
+        active_since: Optional[datetime] = None
+    ) -> List[int]:
+        user_ids = sorted(
+            user_id for user_id, user in self.users.items()
+            if (after_user_id is None or user_id > after_user_id) and self._in_audience(user, active_since)
+        )
+        return user_ids[:limit]
+
+    async def count_users(self, active_since: Optional[datetime] = None) -> int:
+        return sum(1 for user in self.users.values() if self._in_audience(user, active_since))
+
+    async def mark_users_dead(self, reasons: Dict[int, str]) -> None:
+        now = datetime.utcnow()
+        for user_id, reason in reasons.items():
+            if user_id in self.users:
+                self.users[user_id].update({"dead_reason": reason, "dead_at": now})
+
+    async def save_broadcast(self, broadcast: Dict[str, Any]) -> None:
+        self.broadcasts[broadcast["broadcast_id"]] = {**broadcast, "updated_at": datetime.utcnow()}
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        return [dict(broadcast) for broadcast in self.broadcasts.values() if broadcast["status"] == "running"]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stats = {field: 0 for field in STATS_FIELDS}
+        for file in self.files.values():
+            stats["total_files"] += 1
+            stats["total_size"] += file.get("file_size") or 0
+            stats["total_downloads"] += file.get("downloads", 0)
+            stats["active_autodelete_files"] += 1 if file.get("auto_delete") else 0
+        for batch in self.batches.values():
+            if batch.get("status") == "draft":
+                continue
+            stats["total_batches"] += 1
+            stats["batch_downloads"] += batch.get("downloads", 0)
+        stats["total_users"] = len(self.users)
+        return stats
@@ -0,0 +1,453 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Callable, Tuple
+import aiosqlite
+import config
+from .base import Storage, STATS_FIELDS, new_file_document, new_batch_document, delivery_delete_at
+
+# Stay under SQLite's default limit on bound parameters per statement
+SQLITE_MAX_PARAMS = 500
+
+# Fixed-width timestamps so stored dates compare correctly as strings
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (uuid TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS files_batch_id ON files (json_extract(doc, '$.batch_id'));
+CREATE INDEX IF NOT EXISTS files_auto_delete ON files (json_extract(doc, '$.auto_delete'));
+CREATE UNIQUE INDEX IF NOT EXISTS files_file_unique_id ON files (json_extract(doc, '$.file_unique_id'));
+
+CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS batches_created_by ON batches (json_extract(doc, '$.created_by'));
+CREATE INDEX IF NOT EXISTS batches_status ON batches (json_extract(doc, '$.status'));
+
+CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_dead_reason ON users (json_extract(doc, '$.dead_reason'), user_id);
+CREATE INDEX IF NOT EXISTS users_last_active ON users (json_extract(doc, '$.last_active.$date'));
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    sent_at TEXT NOT NULL,
+    delete_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_uuid ON deliveries (uuid, delete_at);
+CREATE INDEX IF NOT EXISTS deliveries_message ON deliveries (chat_id, message_id);
+CREATE INDEX IF NOT EXISTS deliveries_delete_at ON deliveries (delete_at);
+
+CREATE TABLE IF NOT EXISTS scheduled_deletions (id TEXT PRIMARY KEY, due_at TEXT NOT NULL, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS scheduled_deletions_due_at ON scheduled_deletions (due_at);
+
+CREATE TABLE IF NOT EXISTS broadcasts (broadcast_id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS broadcasts_status ON broadcasts (json_extract(doc, '$.status'));
+
+CREATE TABLE IF NOT EXISTS delivery_jobs (job_id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+"""
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.strftime(DATE_FORMAT)}
+    raise TypeError(f"Cannot store {type(value).__name__} in SQLite")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.strptime(obj["$date"], DATE_FORMAT)
+    return obj
+
+
+def _dumps(doc: Dict[str, Any]) -> str:
+    return json.dumps(doc, default=_encode)
+
+
+def _loads(text: str) -> Dict[str, Any]:
+    return json.loads(text, object_hook=_decode)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime(DATE_FORMAT)
+
+
+class SQLiteStorage(Storage):
+    """Single-node backend storing each document as JSON in an aiosqlite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()  # Serializes read-modify-write cycles
+
+    async def start(self) -> None:
+        self.conn = await aiosqlite.connect(self.path)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        await self.conn.executescript(SCHEMA)
+        await self.conn.commit()
+        print("SQLite Storage Ready!")
+
+    async def stop(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def _fetch_doc(self, sql: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+        async with self.conn.execute(sql, params) as cursor:
+            row = await cursor.fetchone()
+        return _loads(row[0]) if row else None
+
+    async def _fetch_docs(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        async with self.conn.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        return [_loads(row[0]) for row in rows]
+
+    async def _insert(self, table: str, key_column: str, key: Any, doc: Dict[str, Any]) -> None:
+        await self.conn.execute(f"INSERT INTO {table} ({key_column}, doc) VALUES (?, ?)", (key, _dumps(doc)))
+        await self.conn.commit()
+
+    async def _save(self, table: str, key_column: str, key: Any, doc: Dict[str, Any]) -> None:
+        await self.conn.execute(
+            f"INSERT INTO {table} ({key_column}, doc) VALUES (?, ?) "
+            f"ON CONFLICT({key_column}) DO UPDATE SET doc = excluded.doc",
+            (key, _dumps(doc))
+        )
+        await self.conn.commit()
+
+    async def _modify(
+        self,
+        table: str,
+        key_column: str,
+        key: Any,
+        change: Callable[[Dict[str, Any]], None]
+    ) -> Optional[Dict[str, Any]]:
+        """Apply change() to a stored document; returns the document before the change"""
+        async with self._lock:
+            doc = await self._fetch_doc(f"SELECT doc FROM {table} WHERE {key_column} = ?", (key,))
+            if doc is None:
+                return None
+            before = dict(doc)
+            change(doc)
+            await self._save(table, key_column, key, doc)
+            return before
+
+    async def add_file(self, file_data: Dict[str, Any]) -> str:
+        file_doc = new_file_document(file_data)
+        await self._insert("files", "uuid", file_doc["uuid"], file_doc)
+        return file_doc["uuid"]
+
+    async def add_files(self, files: List[Dict[str, Any]]) -> List[str]:
+        stored = []
+        for file_data in files:
+            file_doc = new_file_document(file_data)
+            cursor = await self.conn.execute(
+                "INSERT OR IGNORE INTO files (uuid, doc) VALUES (?, ?)",
+                (file_doc["uuid"], _dumps(file_doc))
+            )
+            if cursor.rowcount:
+                stored.append(file_doc["uuid"])
+        await self.conn.commit()
+        return stored
+
+    async def get_file(self, uuid: str) -> Optional[Dict[str, Any]]:
+        return await self._fetch_doc("SELECT doc FROM files WHERE uuid = ?", (uuid,))
+
+    async def get_file_by_unique_id(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        return await self._fetch_doc(
+            "SELECT doc FROM files WHERE json_extract(doc, '$.file_unique_id') = ?",
+            (file_unique_id,)
+        )
+
+    async def get_files_by_unique_ids(self, file_unique_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        unique_ids = list(set(file_unique_ids))
+        files = {}
+        for start in range(0, len(unique_ids), SQLITE_MAX_PARAMS):
+            chunk = unique_ids[start:start + SQLITE_MAX_PARAMS]
+            docs = await self._fetch_docs(
+                f"SELECT doc FROM files WHERE json_extract(doc, '$.file_unique_id') IN ({', '.join('?' * len(chunk))})",
+                tuple(chunk)
+            )
+            files.update((doc["file_unique_id"], doc) for doc in docs)
+        return files
+
+    async def get_files_missing_unique_id(self, after_uuid: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        async with self.conn.execute(
+            "SELECT uuid, json_extract(doc, '$.message_id') FROM files "
+            "WHERE json_extract(doc, '$.file_unique_id') IS NULL AND uuid > ? ORDER BY uuid LIMIT ?",
+            (after_uuid or "", limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [{"uuid": row[0], "message_id": row[1]} for row in rows]
+
+    async def set_file_unique_ids(self, unique_ids: Dict[str, str]) -> int:
+        updated = 0
+        async with self._lock:
+            for uuid, file_unique_id in unique_ids.items():
+                cursor = await self.conn.execute(
+                    "UPDATE OR IGNORE files SET doc = json_set(doc, '$.file_unique_id', ?) WHERE uuid = ?",
+                    (file_unique_id, uuid)
+                )
+                updated += cursor.rowcount
+            await self.conn.commit()
+        return updated
+
+    async def increment_downloads(self, uuid: str) -> None:
+        def change(file):
+            file["downloads"] = file.get("downloads", 0) + 1
+            file["last_download"] = datetime.utcnow()
+        await self._modify("files", "uuid", uuid, change)
+
+    async def set_file_autodelete(self, uuid: str, delete_time: int) -> bool:
+        def change(file):
+            file.update({"auto_delete": True, "auto_delete_time": delete_time, "delete_at": datetime.utcnow()})
+        return await self._modify("files", "uuid", uuid, change) is not None
+
+    async def get_autodelete_files(self) -> List[Dict[str, Any]]:
+        return await self._fetch_docs("SELECT doc FROM files WHERE json_extract(doc, '$.auto_delete') = 1")
+
+    async def record_delivery(
+        self,
+        uuid: str,
+        chat_id: int,
+        message_id: int,
+        delete_after: Optional[int] = None
+    ) -> None:
+        sent_at = datetime.utcnow()
+        await self.conn.execute("DELETE FROM deliveries WHERE delete_at <= ?", (_timestamp(sent_at),))
+        await self.conn.execute(
+            "INSERT INTO deliveries (uuid, chat_id, message_id, sent_at, delete_at) VALUES (?, ?, ?, ?, ?)",
+            (uuid, chat_id, message_id, _timestamp(sent_at), _timestamp(delivery_delete_at(sent_at, delete_after)))
+        )
+        await self.conn.commit()
+
+    async def get_live_deliveries(self, uuid: str) -> List[Dict[str, Any]]:
+        async with self.conn.execute(
+            "SELECT uuid, chat_id, message_id, sent_at, delete_at FROM deliveries WHERE uuid = ? AND delete_at > ?",
+            (uuid, _timestamp(datetime.utcnow()))
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            {
+                "uuid": row[0],
+                "chat_id": row[1],
+                "message_id": row[2],
+                "sent_at": datetime.strptime(row[3], DATE_FORMAT),
+                "delete_at": datetime.strptime(row[4], DATE_FORMAT)
+            }
+            for row in rows
+        ]
+
+    async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None:
+        await self.conn.execute(
+            "DELETE FROM deliveries WHERE chat_id = ? AND message_id = ?",
+            (chat_id, message_id)
+        )
+        await self.conn.commit()
+
+    async def add_scheduled_deletion(self, deletion: Dict[str, Any]) -> None:
+        await self.conn.execute(
+            "INSERT INTO scheduled_deletions (id, due_at, doc) VALUES (?, ?, ?)",
+            (deletion["_id"], _timestamp(deletion["due_at"]), _dumps(deletion))
+        )
+        await self.conn.commit()
+
+    async def get_due_deletions(self, due_before: datetime, limit: int) -> List[Dict[str, Any]]:
+        return await self._fetch_docs(
+            "SELECT doc FROM scheduled_deletions WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+            (_timestamp(due_before), limit)
+        )
+
+    async def remove_scheduled_deletions(self, deletion_ids: List[str]) -> None:
+        await self.conn.executemany(
+            "DELETE FROM scheduled_deletions WHERE id = ?",
+            [(deletion_id,) for deletion_id in deletion_ids]
+        )
+        await self.conn.commit()
+
+    async def save_delivery_job(self, job: Dict[str, Any]) -> None:
+        await self._save("delivery_jobs", "job_id", job["job_id"], {**job, "updated_at": datetime.utcnow()})
+
+    async def get_delivery_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._fetch_doc("SELECT doc FROM delivery_jobs WHERE job_id = ?", (job_id,))
+
+    async def update_delivery_job(self, job_id: str, cursor: int, sent_ids: List[int], failed: int) -> None:
+        def change(job):
+            job["sent_ids"] = job["sent_ids"] + sent_ids
+            job.update({"cursor": cursor, "failed": failed, "updated_at": datetime.utcnow()})
+        await self._modify("delivery_jobs", "job_id", job_id, change)
+
+    async def delete_delivery_job(self, job_id: str) -> None:
+        await self.conn.execute("DELETE FROM delivery_jobs WHERE job_id = ?", (job_id,))
+        await self.conn.commit()
+
+    async def get_pending_delivery_jobs(self) -> List[Dict[str, Any]]:
+        expired = datetime.utcnow() - timedelta(seconds=config.BATCH_JOB_TTL)
+        await self.conn.execute(
+            "DELETE FROM delivery_jobs WHERE json_extract(doc, '$.updated_at.$date') < ?",
+            (_timestamp(expired),)
+        )
+        await self.conn.commit()
+        return await self._fetch_docs("SELECT doc FROM delivery_jobs")
+
+    async def remove_file_messages(self, messages: List[Tuple[int, int]]) -> None:
+        await self.conn.executemany("DELETE FROM deliveries WHERE chat_id = ? AND message_id = ?", messages)
+        await self.conn.commit()
+
+    async def add_batch(self, batch_data: Dict[str, Any]) -> str:
+        return await self.create_batch(new_batch_document(batch_data))
+
+    async def create_batch(self, batch_doc: Dict[str, Any]) -> str:
+        await self._insert("batches", "batch_id", batch_doc["batch_id"], batch_doc)
+        return batch_doc["batch_id"]
+
+    async def get_batch_data(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await self._fetch_doc(
+            "SELECT doc FROM batches WHERE batch_id = ? AND json_extract(doc, '$.status') IS NOT 'draft'",
+            (batch_id,)
+        )
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await self.get_batch_data(batch_id)
+        if batch:
+            batch["files"] = await self.get_batch_files(batch_id)
+        return batch
+
+    async def get_batch_files(self, batch_id: str) -> List[Dict[str, Any]]:
+        return await self._fetch_docs(
+            "SELECT doc FROM files WHERE json_extract(doc, '$.batch_id') = ?",
+            (batch_id,)
+        )
+
+    async def increment_batch_downloads(self, batch_id: str) -> None:
+        def change(batch):
+            batch["downloads"] = batch.get("downloads", 0) + 1
+            batch["last_download"] = datetime.utcnow()
+        await self._modify("batches", "batch_id", batch_id, change)
+
+    async def get_user_batches(self, user_id: int) -> List[Dict[str, Any]]:
+        return await self._fetch_docs(
+            "SELECT doc FROM batches WHERE json_extract(doc, '$.created_by') = ? "
+            "AND json_extract(doc, '$.status') IS NOT 'draft'",
+            (user_id,)
+        )
+
+    async def update_batch_status(self, batch_id: str, status: str) -> None:
+        await self._modify("batches", "batch_id", batch_id, lambda batch: batch.update({"status": status}))
+
+    async def _modify_draft(self, batch_id: str, change: Callable[[Dict[str, Any]], None]) -> bool:
+        def change_draft(batch):
+            if batch.get("status") == "draft":
+                change(batch)
+        before = await self._modify("batches", "batch_id", batch_id, change_draft)
+        return bool(before) and before.get("status") == "draft"
+
+    async def create_batch_draft(self, draft: Dict[str, Any]) -> None:
+        await self.create_batch({**draft, "updated_at": datetime.utcnow()})
+
+    async def update_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> None:
+        await self._modify_draft(batch_id, lambda draft: draft.update(fields, updated_at=datetime.utcnow()))
+
+    async def append_batch_files(self, batch_id: str, files: List[Dict[str, Any]]) -> None:
+        def change(draft):
+            draft["files"] = draft["files"] + files
+            draft.update(total_files=len(draft["files"]), updated_at=datetime.utcnow())
+        await self._modify_draft(batch_id, change)
+
+    async def publish_batch_draft(self, batch_id: str, fields: Dict[str, Any]) -> bool:
+        def change(draft):
+            draft.update(fields, status="active")
+            draft.pop("updated_at", None)
+        return await self._modify_draft(batch_id, change)
+
+    async def delete_batch_draft(self, batch_id: str) -> None:
+        await self.conn.execute(
+            "DELETE FROM batches WHERE batch_id = ? AND json_extract(doc, '$.status') = 'draft'",
+            (batch_id,)
+        )
+        await self.conn.commit()
+
+    async def get_batch_drafts(self) -> List[Dict[str, Any]]:
+        expired = datetime.utcnow() - timedelta(seconds=config.BATCH_DRAFT_TTL)
+        await self.conn.execute(
+            "DELETE FROM batches WHERE json_extract(doc, '$.status') = 'draft' "
+            "AND json_extract(doc, '$.updated_at.$date') < ?",
+            (_timestamp(expired),)
+        )
+        await self.conn.commit()
+        return await self._fetch_docs("SELECT doc FROM batches WHERE json_extract(doc, '$.status') = 'draft'")
+
+    async def add_user(self, user_id: int, username: str = None) -> None:
+        async with self._lock:
+            user = await self._fetch_doc("SELECT doc FROM users WHERE user_id = ?", (user_id,))
+            if user is None:
+                user = {"user_id": user_id, "joined_date": datetime.utcnow()}
+            user.update({"username": username, "last_active": datetime.utcnow(), "dead_reason": None})
+            await self._save("users", "user_id", user_id, user)
+
+    async def update_user_activity(self, user_id: int) -> None:
+        await self._modify("users", "user_id", user_id, lambda user: user.update({"last_active": datetime.utcnow()}))
+
+    async def get_all_users(self) -> List[Dict[str, Any]]:
+        return await self._fetch_docs("SELECT doc FROM users")
+
+    def _audience(self, active_since: Optional[datetime]) -> tuple:
+        sql = "json_extract(doc, '$.dead_reason') IS NULL"
+        if active_since is None:
+            return sql, ()
+        return sql + " AND json_extract(doc, '$.last_active.$date') >= ?", (_timestamp(active_since),)
+
+    async def get_user_ids(
+        self,
+        after_user_id: Optional[int],
+        limit: int,
+        active_since: Optional[datetime] = None
+    ) -> List[int]:
+        where, params = self._audience(active_since)
+        async with self.conn.execute(
+            f"SELECT user_id FROM users WHERE user_id > ? AND {where} ORDER BY user_id LIMIT ?",
+            (after_user_id if after_user_id is not None else -(2 ** 63), *params, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [row[0] for row in rows]
+
+    async def count_users(self, active_since: Optional[datetime] = None) -> int:
+        where, params = self._audience(active_since)
+        async with self.conn.execute(f"SELECT COUNT(*) FROM users WHERE {where}", params) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def mark_users_dead(self, reasons: Dict[int, str]) -> None:
+        now = _timestamp(datetime.utcnow())
+        async with self._lock:
+            await self.conn.executemany(
+                "UPDATE users SET doc = json_set(doc, '$.dead_reason', ?, '$.dead_at', json_object('$date', ?)) "
+                "WHERE user_id = ?",
+                [(reason, now, user_id) for user_id, reason in reasons.items()]
+            )
+            await self.conn.commit()
+
+    async def save_broadcast(self, broadcast: Dict[str, Any]) -> None:
+        await self._save("broadcasts", "broadcast_id", broadcast["broadcast_id"], {**broadcast, "updated_at": datetime.utcnow()})
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        return await self._fetch_docs("SELECT doc FROM broadcasts WHERE json_extract(doc, '$.status') = 'running'")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stats = {field: 0 for field in STATS_FIELDS}
+        async with self.conn.execute(
+            "SELECT COUNT(*), SUM(json_extract(doc, '$.file_size')), SUM(json_extract(doc, '$.downloads')), "
+            "SUM(json_extract(doc, '$.auto_delete') = 1) FROM files"
+        ) as cursor:
+            row = await cursor.fetchone()
+        stats["total_files"], stats["total_size"], stats["total_downloads"], stats["active_autodelete_files"] = (
+            value or 0 for value in row
+        )
+        async with self.conn.execute(
+            "SELECT COUNT(*), SUM(json_extract(doc, '$.downloads')) FROM batches "
+            "WHERE json_extract(doc, '$.status') IS NOT 'draft'"
+        ) as cursor:
+            row = await cursor.fetchone()
+        stats["total_batches"], stats["batch_downloads"] = (value or 0 for value in row)
+        async with self.conn.execute("SELECT COUNT(*) FROM users") as cursor:
+            stats["total_users"] = (await cursor.fetchone())[0]
+        return stats
@@ -2,11 +2,15 @@ import os
 import math
 from typing import Union
 from pyrogram.types import Message
-from PIL import Image
 
 from .button_manager import ButtonManager
-from .progress import progress_callback, humanbytes, TimeFormatter
+from .progress import ProgressReporter, progress_callback, humanbytes, TimeFormatter
 from .admin_check import is_admin
+from .bloom import BloomFilter
+from .cache import TTLCache
+from .single_flight import SingleFlight
+from .rate_limiter import RateLimiter
+from .thumbnails import thumbnail_store
 
 # Utility Functions
 def format_bytes(size: Union[int, float]) -> str:
@@ -48,26 +52,12 @@ async def generate_thumbnail(message: Message) -> str:
         return None
     
     try:
-        thumb = message.document.thumbs[0]
-        file_path = f"downloads/{message.document.file_id}.jpg"
-        
-        if not os.path.exists("downloads"):
-            os.makedirs("downloads")
-        
-        await message.download_media(
-            file_name=file_path,
-            thumb=-1
+        # Same media, same thumbnail: cached on disk under its file_unique_id
+        return await thumbnail_store.get(
+            message._client,
+            message.document.file_unique_id,
+            message.document.thumbs[0].file_id
         )
-        
-        # Optimize thumbnail
-        try:
-            img = Image.open(file_path)
-            img.thumbnail((320, 320))
-            img.save(file_path, "JPEG", quality=95)
-        except Exception as e:
-            print(f"Thumbnail optimization failed: {e}")
-        
-        return file_path
     except Exception as e:
         print(f"Error generating thumbnail: {e}")
         return None
@@ -147,6 +137,7 @@ def get_media_info(message: Message) -> dict:
                 return {
                     "type": media_type,
                     "file_id": getattr(media, "file_id", None),
+                    "file_unique_id": getattr(media, "file_unique_id", None),
                     "file_name": get_file_name(message),
                     "file_size": get_file_size(message),
                     "mime_type": getattr(media, "mime_type", None),
@@ -176,28 +167,19 @@ async def process_media(message: Message) -> dict:
         print(f"Error processing media: {e}")
         return None
 
-class ButtonManager:
-    @staticmethod
-    def start_button():
-        from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        return InlineKeyboardMarkup([
-            [
-                InlineKeyboardButton("Help", callback_data="help"),
-                InlineKeyboardButton("About", callback_data="about")
-            ],
-            [
-                InlineKeyboardButton("Channel", url="https://t.me/thealphabotz"),
-                InlineKeyboardButton("Support", url="https://t.me/Alphabotzchat")
-            ]
-        ])
-
 # Expose functions for external imports
 __all__ = [
     'ButtonManager',
+    'ProgressReporter',
     'progress_callback',
     'humanbytes',
     'TimeFormatter',
     'is_admin',
+    'BloomFilter',
+    'TTLCache',
+    'SingleFlight',
+    'RateLimiter',
+    'thumbnail_store',
     'format_bytes',
     'get_file_type',
     'generate_thumbnail',
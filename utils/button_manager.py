@@ -1,6 +1,28 @@
-from typing import List, Union
+from typing import Any, Dict, List, Tuple, Union
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import UserNotParticipant
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from .cache import TTLCache
+from .single_flight import SingleFlight
 import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared by every ButtonManager so concurrent checks for one user hit Telegram once
+_membership_checks = SingleFlight()
+# user_id -> joined?; non-members are re-checked sooner so joining takes effect quickly
+_memberships = TTLCache(config.FORCE_SUB_CACHE_SIZE, config.FORCE_SUB_CACHE_TTL)
+
+
+def forget_membership(user_id: int) -> None:
+    """Drop a cached force-sub result, e.g. when the user joins or leaves the channel"""
+    _memberships.pop(user_id)
+
+
+def membership_cache_stats() -> Dict[str, Any]:
+    return _memberships.stats()
+
 
 class ButtonManager:
     def __init__(self):
@@ -8,13 +30,29 @@ class ButtonManager:
         self.db_channel = config.DB_CHANNEL_ID
 
     async def check_force_sub(self, client, user_id: int) -> bool:
+        """A failed lookup counts as not joined but is not cached"""
+        joined = _memberships.get(user_id)
+        if joined is not None:
+            return joined
+
+        joined, known = await _membership_checks.do(
+            ("member", user_id),
+            lambda: self._fetch_force_sub(client, user_id)
+        )
+        if known:
+            _memberships.set(user_id, joined, ttl=None if joined else config.FORCE_SUB_NEGATIVE_TTL)
+        return joined
+
+    async def _fetch_force_sub(self, client, user_id: int) -> Tuple[bool, bool]:
+        """(joined, known); known is False when Telegram could not answer"""
         try:
             member = await client.get_chat_member(self.force_sub_channel, user_id)
-            if member.status in ["left", "kicked"]:
-                return False
-            return True
-        except:
-            return False
+        except UserNotParticipant:
+            return False, True
+        except Exception as e:
+            logger.error(f"Force subscription check failed: {e}")
+            return False, False
+        return member.status not in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED], True
 
     async def show_start(self, client, callback_query: CallbackQuery):
         await callback_query.message.edit_text(
@@ -1,44 +1,125 @@
+import asyncio
+import logging
 import math
 import time
-from typing import Union
-from pyrogram.types import Message
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple, Union
+from pyrogram.errors import FloodWait, MessageNotModified
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter:
+    """Edits a status message at most once per interval, skipping unchanged text and backing off on FloodWait"""
+
+    def __init__(
+        self,
+        edit: Callable[[str], Awaitable[Any]],
+        total: int = 0,
+        interval: float = 5,
+        window: float = 30
+    ):
+        self.edit = edit
+        self.total = total
+        self.interval = interval
+        self.window = window
+        self.done = 0
+        self.started = time.monotonic()
+        self._samples: Deque[Tuple[float, int]] = deque()  # (time, done), oldest first
+        self._last_text: Optional[str] = None
+        self._next_edit = 0.0
+        self._flood_until = 0.0
+
+    def advance(self, done: int) -> None:
+        """Record progress without editing"""
+        now = time.monotonic()
+        self.done = done
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and self._samples[1][0] <= now - self.window:
+            self._samples.popleft()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """Units per second over the rolling window"""
+        if len(self._samples) < 2:
+            return 0.0
+        (first_time, first_done), (last_time, last_done) = self._samples[0], self._samples[-1]
+        return (last_done - first_done) / (last_time - first_time) if last_time > first_time else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        rate = self.rate
+        return max(self.total - self.done, 0) / rate if rate else None
+
+    def eta_text(self) -> str:
+        eta = self.eta
+        return (TimeFormatter(round(eta)) or "0s") if eta is not None else "calculating..."
+
+    async def update(self, done: int, render: Callable[[], str]) -> None:
+        """Record progress and edit the message if an edit is due"""
+        self.advance(done)
+        if time.monotonic() < max(self._next_edit, self._flood_until):
+            return
+        # Claimed before awaiting, so concurrent callers do not edit at the same time
+        self._next_edit = time.monotonic() + self.interval
+        await self._edit(render())
+
+    async def finish(self, text: str) -> None:
+        """Edit in the final text, waiting out a FloodWait instead of dropping it"""
+        for _ in range(2):
+            await asyncio.sleep(max(self._flood_until - time.monotonic(), 0))
+            if await self._edit(text):
+                return
+
+    async def _edit(self, text: str) -> bool:
+        if text == self._last_text:
+            return True
+        try:
+            await self.edit(text)
+            self._last_text = text
+            return True
+        except MessageNotModified:
+            self._last_text = text
+            return True
+        except FloodWait as e:
+            logger.warning(f"FloodWait on progress edit, backing off for {e.value}s")
+            self._flood_until = time.monotonic() + e.value
+        except Exception as e:
+            logger.error(f"Failed to update progress message: {e}")
+        return False
+
 
 async def progress_callback(
     current: int,
     total: int,
-    message: Message,
-    start_time: float,
+    reporter: ProgressReporter,
     status: str = "Uploading",
     file_name: str = ""
 ) -> None:
-    now = time.time()
-    diff = now - start_time
-    if diff < 1:
-        return
-    
-    speed = current / diff
-    percentage = current * 100 / total
-    time_to_complete = round((total - current) / speed)
-    time_to_complete = TimeFormatter(time_to_complete)
-    
-    progress = "[{0}{1}] \n".format(
-        ''.join(["●" for i in range(math.floor(percentage / 5))]),
-        ''.join(["○" for i in range(20 - math.floor(percentage / 5))])
-    )
-    
-    current_message = (
-        f"{status}\n"
-        f"{progress}\n"
-        f"File Name: {file_name}\n"
-        f"Progress: {current * 100 / total:.1f}%\n"
-        f"Speed: {humanbytes(speed)}/s\n"
-        f"ETA: {time_to_complete}\n"
-    )
-    
-    try:
-        await message.edit(current_message)
-    except:
-        pass
+    """Pyrogram progress hook; the caller owns the reporter, so an aborted transfer leaves nothing behind"""
+    reporter.total = total
+
+    def render() -> str:
+        percentage = current * 100 / total if total else 100
+        filled = math.floor(percentage / 5)
+        return (
+            f"{status}\n"
+            f"[{'●' * filled}{'○' * (20 - filled)}] \n\n"
+            f"File Name: {file_name}\n"
+            f"Progress: {percentage:.1f}%\n"
+            f"Speed: {humanbytes(reporter.rate)}/s\n"
+            f"ETA: {reporter.eta_text()}\n"
+        )
+
+    if current >= total:
+        reporter.advance(current)
+        await reporter.finish(render())
+    else:
+        await reporter.update(current, render)
 
 def humanbytes(size: Union[int, float]) -> str:
     if not size:
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Spaces acquisitions evenly so all callers together stay under rate per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if self._paused_until <= time.monotonic():  # Not paused while we waited for the slot
+                return
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for seconds, e.g. after a FloodWait"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, Tuple
+from PIL import Image
+from pyrogram import Client
+from .single_flight import SingleFlight
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _shrink(data: bytes, size: Tuple[int, int]) -> bytes:
+    """Resize a JPEG/WebP thumbnail in memory; the original bytes are kept if Pillow cannot read them"""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.thumbnail(size)
+            output = BytesIO()
+            img.convert("RGB").save(output, "JPEG", quality=95)
+            return output.getvalue()
+    except Exception as e:
+        logger.warning(f"Thumbnail optimization failed: {e}")
+        return data
+
+
+def _write(path: str, data: bytes) -> None:
+    temp_path = f"{path}.part"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)  # Readers never see a half-written thumbnail
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ThumbnailStore:
+    """Thumbnails on disk named by file_unique_id, evicted least recently used beyond max_bytes"""
+
+    def __init__(self, directory: str, max_bytes: int, workers: int, size: Tuple[int, int] = (320, 320)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files: "OrderedDict[str, int]" = OrderedDict()  # File name -> bytes, least recently used first
+        self._bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnail")
+        self._flights = SingleFlight()  # One download per thumbnail, however many callers ask
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [
+            entry for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(".jpg")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        return OrderedDict((entry.name, entry.stat().st_size) for entry in entries)
+
+    async def _load(self) -> None:
+        """Adopt thumbnails left on disk by earlier runs, oldest first"""
+        async with self._load_lock:
+            if not self._loaded:
+                self._files = await self._run(self._scan)
+                self._bytes = sum(self._files.values())
+                self._loaded = True
+                await self._evict()
+
+    async def get(self, client: Client, file_unique_id: str, thumb_file_id: str) -> str:
+        """Path of the thumbnail for a file, downloading and resizing it only on the first request"""
+        await self._load()
+        name = f"{file_unique_id}.jpg"
+        if name in self._files:
+            self._files.move_to_end(name)
+            self.hits += 1
+            return self._path(name)
+
+        self.misses += 1
+        return await self._flights.do(name, lambda: self._create(client, name, thumb_file_id))
+
+    async def _create(self, client: Client, name: str, thumb_file_id: str) -> str:
+        download = await client.download_media(thumb_file_id, in_memory=True)
+        data = await self._run(_shrink, download.getvalue(), self.size)
+        path = self._path(name)
+        await self._run(_write, path, data)
+
+        self._files[name] = len(data)
+        self._bytes += len(data)
+        await self._evict()
+        return path
+
+    async def _evict(self) -> None:
+        # The newest thumbnail stays even if it alone exceeds the cap
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            await self._run(_remove, self._path(name))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+thumbnail_store = ThumbnailStore(config.THUMBNAIL_DIR, config.THUMBNAIL_CACHE_SIZE, config.THUMBNAIL_WORKERS)